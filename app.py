@@ -1,11 +1,18 @@
 import os
 import logging
+import time
 
-from flask import Flask
+import click
+from flask import Flask, current_app
+from flask.cli import with_appcontext
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy import inspect
+from sqlalchemy.orm import DeclarativeBase, make_transient_to_detached
 from flask_login import LoginManager
 
+from db_routing import REPLICA_BIND, RoutingSession, replica_reads
+from upload_spool import SpoolingRequest
+
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
 
@@ -13,37 +20,161 @@ class Base(DeclarativeBase):
     pass
 
 # Initialize SQLAlchemy
-db = SQLAlchemy(model_class=Base)
-
-# Create the Flask app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
-
-# Configure the database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///pdf_converter.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-# Initialize the database
-db.init_app(app)
+db = SQLAlchemy(model_class=Base, session_options={"class_": RoutingSession})
 
 # Initialize Flask-Login
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+login_manager.login_view = 'main.login'
 login_manager.login_message = 'Please log in to access this page.'
 login_manager.login_message_category = 'info'
 
-with app.app_context():
-    # Import models to create tables
-    from models import User, Conversion
-    db.create_all()
+def create_app(config=None):
+    """
+    Create the Flask app: configuration from the environment, overridden by config, plus
+    the extensions and routes. Creating it does not touch the database; the tables are
+    created and migrated by init_db (`flask --app app init-db`).
+    """
+    app = Flask(__name__)
+    # Spool uploads to UPLOAD_FOLDER instead of buffering them in memory
+    app.request_class = SpoolingRequest
+    app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
+
+    # Configure the database
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///pdf_converter.db")
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+    # Connection pool of each engine: DB_POOL_SIZE connections kept open plus up to DB_MAX_OVERFLOW
+    # more under load; a request waits DB_POOL_TIMEOUT seconds for one before failing. Size it for
+    # the threads using the database: ASGI_THREADS (or the WSGI server's threads) plus CONVERSION_WORKERS
+    if ":memory:" not in app.config["SQLALCHEMY_DATABASE_URI"] and app.config["SQLALCHEMY_DATABASE_URI"] != "sqlite://":
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"].update(
+            pool_size=int(os.environ.get("DB_POOL_SIZE", 10)),
+            max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 30)),
+            pool_timeout=int(os.environ.get("DB_POOL_TIMEOUT", 10)),
+        )
+    # Optional read replica for the SELECTs of read-only views and the user loader (see db_routing.py)
+    if os.environ.get("DATABASE_REPLICA_URL"):
+        app.config["SQLALCHEMY_BINDS"] = {REPLICA_BIND: os.environ["DATABASE_REPLICA_URL"]}
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+    # Configure background conversion jobs
+    app.config["UPLOAD_FOLDER"] = os.environ.get("UPLOAD_FOLDER", os.path.join(app.instance_path, "uploads"))
+    app.config["CONVERSION_WORKERS"] = int(os.environ.get("CONVERSION_WORKERS", 2))
+    # A running job's lease is renewed by its process while the job runs; jobs whose lease
+    # expired (their process stopped renewing them this many seconds ago) are requeued by any process
+    app.config["CONVERSION_JOB_LEASE"] = int(os.environ.get("CONVERSION_JOB_LEASE", 60))
+    # Jobs with at least this many pages to lay out are converted in the converter's process pool
+    # instead of the worker thread; the default 1 sends every document there, so the workers of a
+    # batch convert in parallel rather than taking turns on the GIL of the web process
+    app.config["CONVERSION_PARALLEL_MIN_PAGES"] = int(os.environ.get("CONVERSION_PARALLEL_MIN_PAGES", 1))
+    # A job claimed this many times without finishing (its worker was killed, e.g. by a PDF that
+    # crashes or exhausts the converter) is marked failed instead of being requeued again
+    app.config["CONVERSION_MAX_ATTEMPTS"] = int(os.environ.get("CONVERSION_MAX_ATTEMPTS", 3))
+    app.config["BATCH_MAX_FILES"] = int(os.environ.get("BATCH_MAX_FILES", 500))
+
+    # Configure upload limits: requests above MAX_CONTENT_LENGTH are rejected with 413,
+    # files above UPLOAD_SPOOL_THRESHOLD are spooled to disk while the request is parsed
+    app.config["MAX_CONTENT_LENGTH"] = int(os.environ.get("MAX_UPLOAD_MB", 100)) * 1024 * 1024
+    app.config["UPLOAD_SPOOL_THRESHOLD"] = int(os.environ.get("UPLOAD_SPOOL_THRESHOLD", 1024 * 1024))
+
+    # Threads running the Flask app under the ASGI entry point (asgi.py); request bodies are
+    # received on the event loop, so these are only busy while a request is being handled
+    app.config["ASGI_THREADS"] = int(os.environ.get("ASGI_THREADS", 32))
+
+    # Configure the conversion cache (total bytes of cached XML no conversion references before LRU eviction)
+    app.config["CONVERSION_CACHE_MAX_BYTES"] = int(os.environ.get("CONVERSION_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+    # Write indented XML (set XML_PRETTY_PRINT=0 for compact output)
+    app.config["XML_PRETTY_PRINT"] = os.environ.get("XML_PRETTY_PRINT", "1") not in ("0", "false", "False")
+
+    # Reconstruct tables from the glyph layout as <table> elements (set XML_DETECT_TABLES=0 to keep them as text blocks)
+    app.config["XML_DETECT_TABLES"] = os.environ.get("XML_DETECT_TABLES", "1") not in ("0", "false", "False")
+
+    # Repeat the font attributes on every <span> instead of referencing the <styles> table in the metadata
+    app.config["XML_INLINE_STYLES"] = os.environ.get("XML_INLINE_STYLES", "0") in ("1", "true", "True")
+
+    # Copy unchanged pages from the previous conversion of a PDF with the same name instead of
+    # laying them out again (set INCREMENTAL_CONVERSION=0 to always convert every page)
+    app.config["INCREMENTAL_CONVERSION"] = os.environ.get("INCREMENTAL_CONVERSION", "1") not in ("0", "false", "False")
+
+    # Seconds a loaded user is reused by load_user without querying the database (0 disables the cache)
+    app.config["USER_CACHE_TTL"] = int(os.environ.get("USER_CACHE_TTL", 30))
+
+    # Seconds the per-user conversion count shown on /history is cached (0 disables the cache)
+    app.config["HISTORY_COUNT_CACHE_TTL"] = int(os.environ.get("HISTORY_COUNT_CACHE_TTL", 60))
+
+    # Clients allowed to scrape /metrics (comma separated addresses), everyone else gets a 404
+    app.config["METRICS_ALLOWED_IPS"] = [address.strip() for address in
+                                         os.environ.get("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",")]
+
+    # Configure the compressed XML artifact store ('gzip', or 'zstd' when zstandard is installed)
+    app.config["ARTIFACT_FOLDER"] = os.environ.get("ARTIFACT_FOLDER", os.path.join(app.instance_path, "artifacts"))
+    app.config["ARTIFACT_COMPRESSION"] = os.environ.get("ARTIFACT_COMPRESSION", "gzip")
+
+    # Source code PDF served by /download/source-code and its cached per-file parts, see generate_code_pdf.py
+    app.config["SOURCE_PDF_FOLDER"] = os.environ.get("SOURCE_PDF_FOLDER", os.path.join(app.instance_path, "source_pdf"))
+
+    if config:
+        app.config.update(config)
+
+    db.init_app(app)
+    login_manager.init_app(app)
+
+    from routes import bp
+    app.register_blueprint(bp)
+    app.cli.add_command(init_db_command)
+    return app
+
+def init_db():
+    """
+    Create the missing tables in the database of the current app and migrate existing
+    ones to the current schema, see migrations.py. Returns the migrations applied.
+    """
+    import migrations
+    return migrations.upgrade()
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create or migrate the database tables; run once per deployment, before the web workers start."""
+    for version, description in init_db():
+        click.echo(f'Applied migration {version}: {description}')
+    click.echo('Initialized the database.')
+
+# Users loaded by load_user, {user_id: (expires, detached copy)}
+_user_cache = {}
+
+def _detached_user(user):
+    """Copy of user's column values that belongs to no session and can be shared between requests."""
+    from models import User
+    copy = User(**{attribute.key: getattr(user, attribute.key) for attribute in inspect(User).column_attrs})
+    make_transient_to_detached(copy)
+    return copy
 
 # User loader for Flask-Login
 @login_manager.user_loader
 def load_user(user_id):
+    """Load the logged in user, cached for USER_CACHE_TTL seconds so most requests skip the query."""
     from models import User
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    ttl = current_app.config["USER_CACHE_TTL"]
+    now = time.monotonic()
+    cached = _user_cache.get(user_id)
+    if ttl > 0 and cached is not None and cached[0] > now:
+        # Attach a copy to this request's session without loading it again
+        return db.session.merge(cached[1], load=False)
+
+    with replica_reads():
+        user = db.session.get(User, user_id)
+    if user is None:
+        # A user who just registered may not have reached the replica yet
+        user = db.session.get(User, user_id)
+    if user is not None and ttl > 0:
+        _user_cache[user_id] = (now + ttl, _detached_user(user))
+    return user
+
+def invalidate_user(user_id):
+    """Drop a user from the load_user cache, after changing or deleting it."""
+    _user_cache.pop(user_id, None)
@@ -0,0 +1,93 @@
+import gzip
+import hashlib
+import os
+import tempfile
+import time
+from collections import namedtuple
+
+from flask import current_app
+
+import metrics
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, gzip is always available
+    zstandard = None
+
+EXTENSIONS = {'gzip': '.xml.gz', 'zstd': '.xml.zst'}
+
+StoredArtifact = namedtuple('StoredArtifact', ['digest', 'storage_path', 'compression', 'size'])
+
+def _compression():
+    compression = current_app.config['ARTIFACT_COMPRESSION']
+    if compression == 'zstd' and zstandard is None:
+        return 'gzip'
+    return compression
+
+def _open_writer(raw, compression):
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor().stream_writer(raw, closefd=False)
+    # mtime=0 keeps the compressed bytes identical for identical XML
+    return gzip.GzipFile(fileobj=raw, mode='wb', mtime=0)
+
+def full_path(storage_path):
+    """Absolute path of a stored artifact."""
+    return os.path.join(current_app.config['ARTIFACT_FOLDER'], storage_path)
+
+def write_artifact(chunks):
+    """
+    Compress the concatenation of the UTF-8 bytes chunks to disk under a path derived from the
+    SHA-256 of the uncompressed XML, and return a StoredArtifact describing it.
+    Chunks are written as they arrive, so the XML never has to be held in memory.
+    """
+    root = current_app.config['ARTIFACT_FOLDER']
+    compression = _compression()
+    os.makedirs(root, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    # Only the hashing, compression and writing count as 'store', not producing the chunks
+    store_seconds = 0.0
+    fd, tmp_path = tempfile.mkstemp(dir=root, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            with _open_writer(raw, compression) as writer:
+                for chunk in chunks:
+                    start = time.perf_counter()
+                    digest.update(chunk)
+                    writer.write(chunk)
+                    size += len(chunk)
+                    store_seconds += time.perf_counter() - start
+
+        hexdigest = digest.hexdigest()
+        storage_path = os.path.join(hexdigest[:2], hexdigest[2:4], hexdigest + EXTENSIONS[compression])
+        destination = os.path.join(root, storage_path)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        if os.path.exists(destination):
+            # Same XML is already stored, content addressing makes it safe to share
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, destination)
+        metrics.add_stage_time('store', store_seconds)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return StoredArtifact(hexdigest, storage_path, compression, size)
+
+def open_artifact(storage_path, compression):
+    """Open a stored artifact as a readable binary stream of the uncompressed XML."""
+    path = full_path(storage_path)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise Exception("zstandard is required to read zstd-compressed artifacts")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return gzip.open(path, 'rb')
+
+def delete_artifact(storage_path):
+    """Remove a stored artifact file, ignoring files that are already gone."""
+    try:
+        os.remove(full_path(storage_path))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,208 @@
+"""
+ASGI entry point for high-concurrency deployments, alongside the WSGI entry point main.py:
+
+    flask --app app init-db && uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+Request bodies are received on the event loop and spooled to disk, so a slow upload costs
+a coroutine and a file rather than a worker thread. Only complete requests are handed to
+the Flask app, on a bounded thread pool, and responses are streamed back as the app
+produces them. Conversion jobs run in the converter's process pool (every document, not only
+long ones, unless CONVERSION_PARALLEL_MIN_PAGES is set), so the CPU-bound layout work
+never competes with request handling for the GIL.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app import create_app
+import metrics
+from jobs import start_workers
+
+# Request bodies are kept in memory up to this size, then spooled to UPLOAD_FOLDER
+BODY_MEMORY_LIMIT = 64 * 1024
+
+IN_FLIGHT = metrics.Gauge('asgi_requests_in_flight',
+                          'ASGI requests receiving their body or being handled by the app', ['state'])
+
+class WSGIBridge:
+    """
+    Minimal ASGI to WSGI adapter. Unlike running the WSGI app per connection, the body is
+    received asynchronously before a thread is taken, and requests that announce a body
+    above MAX_CONTENT_LENGTH are rejected before any of it is read.
+    """
+
+    def __init__(self, wsgi_app, threads, on_startup=None):
+        self.wsgi_app = wsgi_app
+        self.on_startup = on_startup
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='asgi')
+        self._in_flight = {'receiving': 0, 'handling': 0}
+        self._lock = threading.Lock()
+        metrics.register_collector(self._collect_in_flight)
+
+    def _collect_in_flight(self):
+        with self._lock:
+            counts = dict(self._in_flight)
+        for state, count in counts.items():
+            IN_FLIGHT.set(count, state=state)
+
+    def _track(self, state, delta):
+        with self._lock:
+            self._in_flight[state] += delta
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise Exception(f"Unsupported ASGI scope type {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    if self.on_startup is not None:
+                        self.on_startup()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        limit = flask_app.config['MAX_CONTENT_LENGTH']
+        headers = dict(scope['headers'])
+        announced = headers.get(b'content-length')
+        if limit is not None and announced is not None and announced.isdigit() and int(announced) > limit:
+            await _send_error(send, 413, b'Request Entity Too Large')
+            return
+
+        body = tempfile.SpooledTemporaryFile(max_size=BODY_MEMORY_LIMIT, dir=flask_app.config['UPLOAD_FOLDER'])
+        try:
+            self._track('receiving', 1)
+            try:
+                size = await _receive_body(receive, body, limit)
+            finally:
+                self._track('receiving', -1)
+            if size is None:
+                # Client went away mid-upload
+                return
+            if limit is not None and size > limit:
+                await _send_error(send, 413, b'Request Entity Too Large')
+                return
+            body.seek(0)
+
+            environ = _environ(scope, body, size)
+            loop = asyncio.get_running_loop()
+            self._track('handling', 1)
+            try:
+                await loop.run_in_executor(self.executor, self._run_app, environ, send, loop)
+            finally:
+                self._track('handling', -1)
+        finally:
+            body.close()
+
+    def _run_app(self, environ, send, loop):
+        """Run the WSGI app in a pool thread and forward its response to the event loop."""
+        response = {}
+
+        def send_message(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def send_head():
+            if not response.get('sent'):
+                send_message({'type': 'http.response.start', 'status': response['status'],
+                              'headers': response['headers']})
+                response['sent'] = True
+
+        def write(data):
+            send_head()
+            send_message({'type': 'http.response.body', 'body': bytes(data), 'more_body': True})
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info is not None and response.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                   for name, value in headers]
+            return write
+
+        body = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in body:
+                if chunk:
+                    write(chunk)
+            send_head()
+            send_message({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+async def _receive_body(receive, body, limit):
+    """Copy the request body into body; returns its size, or None if the client disconnected."""
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if limit is not None and size > limit:
+            # Stop storing, the request is rejected once the client has finished sending
+            body.truncate(0)
+        else:
+            body.write(chunk)
+        if not message.get('more_body', False):
+            return size
+
+async def _send_error(send, status, text):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'text/plain'), (b'content-length', str(len(text)).encode())]})
+    await send({'type': 'http.response.body', 'body': text})
+
+def _environ(scope, body, size):
+    """Build the WSGI environ of an ASGI http scope, following PEP 3333 string handling."""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    client = scope.get('client')
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0] if client else '',
+        'CONTENT_LENGTH': str(size),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+            continue
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+flask_app = create_app()
+os.makedirs(flask_app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+# The background conversion workers of each server process start with its lifespan, not on import
+app = WSGIBridge(flask_app, flask_app.config['ASGI_THREADS'], on_startup=lambda: start_workers(flask_app))
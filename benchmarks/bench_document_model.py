@@ -0,0 +1,71 @@
+"""
+Document model benchmark: the memory needed to hold the structure of a whole document as
+pdfminer LTPages versus as document_model Pages, measured with tracemalloc and
+extrapolated to 1000 pages.
+
+    python -m benchmarks.bench_document_model --pages 100
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import MIXED_FONTS, CorpusSpec, build_pdf
+from document_model import build_page
+from pdf_converter import iter_page_layouts
+
+def _retained_mb(build):
+    """Memory still allocated by the objects build() returns, once they are built."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        retained = build()
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del retained
+    return size / (1024 * 1024)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=100)
+    parser.add_argument('--lines', type=int, default=40)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        spec = CorpusSpec('model', args.pages, args.lines, MIXED_FONTS, 0.2)
+        pdf_path = build_pdf(spec, os.path.join(tmp, 'model.pdf'))
+
+        def layouts():
+            with open(pdf_path, 'rb') as pdf_file:
+                return list(iter_page_layouts(pdf_file))
+
+        def pages():
+            with open(pdf_path, 'rb') as pdf_file:
+                return [build_page(number, layout) for number, layout in iter_page_layouts(pdf_file)]
+
+        layout_mb = _retained_mb(layouts)
+        model_mb = _retained_mb(pages)
+
+        retained = layouts()
+        start = time.perf_counter()
+        for number, layout in retained:
+            build_page(number, layout)
+        build_seconds = time.perf_counter() - start
+
+    scale = 1000 / args.pages
+    print(f"{args.pages} pages x {args.lines} lines")
+    print(f"{'representation':<16}{'MB':>9}{'MB per 1000 pages':>20}")
+    print(f"{'pdfminer LTPage':<16}{layout_mb:>9.1f}{layout_mb * scale:>20.0f}")
+    print(f"{'document model':<16}{model_mb:>9.1f}{model_mb * scale:>20.0f}  ({layout_mb / model_mb:.0f}x smaller)")
+    print(f"build_page {build_seconds / args.pages * 1000:.2f} ms/page")
+
+if __name__ == '__main__':
+    main()
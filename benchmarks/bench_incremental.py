@@ -0,0 +1,58 @@
+"""
+Incremental re-conversion benchmark: a long contract is converted once, then a revision
+with a few amended pages is converted both from scratch and by reusing the unchanged pages
+of the first conversion (PageFragments). The two results are checked to be identical.
+
+    python -m benchmarks.bench_incremental --pages 200 --amended 1
+"""
+import argparse
+import io
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import MIXED_FONTS, CorpusSpec, build_pdf
+from pdf_converter import PageFragments, iter_converted_xml
+
+CREATION_DATE = re.compile(rb'<creation-date>.*?</creation-date>')
+
+def _convert(pdf_path, workers, **kwargs):
+    start = time.perf_counter()
+    xml = b''.join(iter_converted_xml(pdf_path, workers=workers, **kwargs))
+    return xml, time.perf_counter() - start
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--amended', type=int, default=1, help='number of amended pages in the revision')
+    parser.add_argument('--workers', type=int, default=None, help='converter processes (default: PDF_CONVERTER_WORKERS)')
+    args = parser.parse_args(argv)
+
+    spec = CorpusSpec('contract', args.pages, 40, MIXED_FONTS, 0.1)
+    # Spread the amendments over the document
+    amended = {1 + index * args.pages // args.amended for index in range(args.amended)}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        original = build_pdf(spec, os.path.join(tmp, 'original.pdf'))
+        revision = build_pdf(spec, os.path.join(tmp, 'revision.pdf'), variant='revision', amended_pages=amended)
+
+        page_index = []
+        original_xml, original_seconds = _convert(original, args.workers, page_index=page_index)
+        full_xml, full_seconds = _convert(revision, args.workers)
+        previous = PageFragments(lambda: io.BytesIO(original_xml), page_index)
+        incremental_xml, incremental_seconds = _convert(revision, args.workers, previous=previous)
+
+    identical = CREATION_DATE.sub(b'', full_xml) == CREATION_DATE.sub(b'', incremental_xml)
+    print(f"{args.pages} pages, {len(amended)} amended")
+    print(f"first conversion (with page index) {original_seconds:8.2f}s")
+    print(f"revision, full conversion          {full_seconds:8.2f}s")
+    print(f"revision, incremental              {incremental_seconds:8.2f}s  ({full_seconds / incremental_seconds:.0f}x)")
+    print(f"identical output: {identical}")
+    return 0 if identical else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
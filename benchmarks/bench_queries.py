@@ -0,0 +1,145 @@
+"""
+Database load benchmark: SQL statements per request, split between the primary and the
+read replica, and requests per second for concurrent logged-in clients, with the user
+loader cache and replica routing off and on.
+
+    python -m benchmarks.bench_queries --threads 16 --requests 50
+
+Each variant runs in its own process, configured through the environment create_app reads,
+so module-level state such as the load_user cache starts out empty. The "replica" is a
+second engine on a copy of the SQLite database, which is enough to see which statements
+would leave the primary.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Name, environment of the variant
+VARIANTS = [
+    ('no cache', {'USER_CACHE_TTL': '0'}),
+    ('user cache', {'USER_CACHE_TTL': '30'}),
+    ('user cache + replica', {'USER_CACHE_TTL': '30', 'DATABASE_REPLICA_URL': 'replica'}),
+]
+
+CONVERSIONS = 200
+
+def _seed():
+    """Create the tables, the benchmark user and its conversion history."""
+    from app import create_app, db, init_db
+    from models import Conversion, User
+    app = create_app()
+    with app.app_context():
+        init_db()
+        user = User(username='bench', email='bench@example.com')
+        user.set_password('benchmark')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add_all(Conversion(pdf_filename=f'doc{n}.pdf', xml_filename=f'doc{n}.xml',
+                                      file_size=1024, user_id=user.id) for n in range(CONVERSIONS))
+        db.session.commit()
+
+def run_variant(threads, requests):
+    """Load test the app configured by the environment; returns per endpoint statistics."""
+    from app import create_app, db
+    from sqlalchemy import event
+    logging.getLogger().setLevel(logging.WARNING)
+
+    app = create_app({'WTF_CSRF_ENABLED': False})
+
+    counts = {'primary': 0, 'replica': 0}
+    lock = threading.Lock()
+    with app.app_context():
+        for key, engine in db.engines.items():
+            def count(*args, role='replica' if key == 'replica' else 'primary'):
+                with lock:
+                    counts[role] += 1
+            event.listen(engine, 'before_cursor_execute', count)
+
+    def client():
+        client = app.test_client()
+        client.post('/login', data={'email': 'bench@example.com', 'password': 'benchmark'})
+        return client
+
+    clients = [client() for _ in range(threads)]
+    endpoints = {
+        'history': lambda client, n: client.get('/history'),
+        'conversion api': lambda client, n: client.get(f'/api/conversion/{n % CONVERSIONS + 1}'),
+        'dashboard': lambda client, n: client.get('/dashboard'),
+    }
+    results = {}
+    for name, fetch in endpoints.items():
+        def worker(client):
+            for n in range(requests):
+                response = fetch(client, n)
+                if response.status_code != 200:
+                    raise Exception(f"{name} returned status {response.status_code}")
+
+        # One request per client first, so every variant is measured with a warm user cache
+        for each in clients:
+            fetch(each, 0)
+        before = dict(counts)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(worker, clients))
+        seconds = time.perf_counter() - start
+        total = threads * requests
+        results[name] = {
+            'primary': (counts['primary'] - before['primary']) / total,
+            'replica': (counts['replica'] - before['replica']) / total,
+            'rps': total / seconds,
+        }
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=50, help='requests per thread and endpoint')
+    # Set in the per-variant processes
+    parser.add_argument('--variant', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.variant:
+        json.dump(run_variant(args.threads, args.requests), sys.stdout)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        primary = os.path.join(tmp, 'bench.db')
+        replica = os.path.join(tmp, 'replica.db')
+        base_env = dict(os.environ,
+                        DATABASE_URL=f'sqlite:///{primary}',
+                        UPLOAD_FOLDER=os.path.join(tmp, 'uploads'),
+                        ARTIFACT_FOLDER=os.path.join(tmp, 'artifacts'),
+                        CONVERSION_WORKERS='0')
+        # Seed the database once in a throwaway process, then copy it as the replica
+        subprocess.run([sys.executable, '-c', 'import sys; sys.path.insert(0, sys.argv[1]); '
+                        'from benchmarks.bench_queries import _seed; _seed()',
+                        os.path.dirname(os.path.dirname(os.path.abspath(__file__)))],
+                       env=base_env, check=True, stderr=subprocess.DEVNULL)
+        shutil.copyfile(primary, replica)
+
+        print(f"{args.threads} threads x {args.requests} requests per endpoint, {CONVERSIONS} conversions")
+        print(f"{'variant':<22}{'endpoint':<16}{'primary q/req':>14}{'replica q/req':>14}{'req/s':>9}")
+        for name, overrides in VARIANTS:
+            env = dict(base_env, **overrides)
+            if env.get('DATABASE_REPLICA_URL'):
+                env['DATABASE_REPLICA_URL'] = f'sqlite:///{replica}'
+            output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_queries',
+                                     '--threads', str(args.threads), '--requests', str(args.requests),
+                                     '--variant'],
+                                    env=env, check=True, capture_output=True, text=True,
+                                    cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            for endpoint, stats in json.loads(output.stdout).items():
+                print(f"{name:<22}{endpoint:<16}{stats['primary']:>14.2f}{stats['replica']:>14.2f}{stats['rps']:>9.0f}")
+
+if __name__ == '__main__':
+    main()
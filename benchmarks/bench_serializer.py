@@ -0,0 +1,131 @@
+"""
+Serializer benchmark: compares the lxml.etree.xmlfile DocumentWriter (pretty and compact)
+with the previous approach of rendering every page into a list of f-strings and joining
+the whole document in memory.
+
+Pages are laid out once by pdfminer into the document model and then serialized
+repeatedly, so the numbers only cover XML serialization. Each variant runs in its own process to get a clean peak RSS.
+
+    python -m benchmarks.bench_serializer --pages 200 --lines 40
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from xml.sax.saxutils import escape, quoteattr
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import MIXED_FONTS, CorpusSpec, build_pdf
+from document_model import Figure, TextBlock
+from pdf_converter import iter_pages
+from xml_serializer import DocumentWriter
+
+class NullSink:
+    """Counts bytes written without keeping them, like a socket or a compressed file would."""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
+
+def _legacy_page(page):
+    """The list-of-strings page renderer the xmlfile writer replaced."""
+    def bbox(box):
+        return f'x0="{box.x0:.2f}" y0="{box.y0:.2f}" x1="{box.x1:.2f}" y1="{box.y1:.2f}"'
+
+    parts = [f'    <page number="{page.number}" width="{page.width:.2f}" height="{page.height:.2f}">']
+    block_index = 0
+    for element in page.elements:
+        if isinstance(element, TextBlock):
+            block_index += 1
+            parts.append(f'      <text-block id="p{page.number}-b{block_index}" {bbox(element)}>')
+            for line in element.lines:
+                parts.append(f'        <line {bbox(line)}>')
+                for span in line.spans:
+                    attrs = ' '.join(f'{name}={quoteattr(value)}' for name, value in span.style)
+                    parts.append(f'          <span {attrs}>{escape(span.text)}</span>')
+                parts.append('        </line>')
+            parts.append('      </text-block>')
+        elif isinstance(element, Figure):
+            parts.append(f'      <figure {bbox(element)}/>')
+    parts.append('    </page>')
+    return '\n'.join(parts)
+
+def _serialize(variant, pages, metadata):
+    sink = NullSink()
+    if variant == 'strings':
+        xml_parts = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>', '<pdf-document>', '  <document-content>']
+        xml_parts.extend(_legacy_page(page) for page in pages)
+        xml_parts.extend(['  </document-content>', '</pdf-document>'])
+        sink.write('\n'.join(xml_parts).encode('utf-8'))
+    else:
+        with DocumentWriter(sink, metadata, pretty=variant == 'xmlfile-pretty') as writer:
+            for page in pages:
+                writer.write_page(page)
+                writer.flush()
+    return sink.size
+
+def _current_rss_kb():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+
+def _run_variant(variant, pdf_path, repeat, results):
+    with open(pdf_path, 'rb') as pdf_file:
+        pages = [page for _, page in iter_pages(pdf_file, detect_tables=False)]
+    metadata = {'creation_date': '2026-01-01T00:00:00', 'file_size': os.path.getsize(pdf_path), 'content_sample': ''}
+
+    rss_before = _current_rss_kb()
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        size = _serialize(variant, pages, metadata)
+    elapsed = (time.perf_counter() - start) / repeat
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KB on Linux
+
+    results.put({
+        'variant': variant,
+        'bytes': size,
+        'seconds': elapsed,
+        'throughput_mb_s': size / elapsed / 1e6,
+        'peak_rss_growth_mb': max(peak_rss - rss_before, 0) / 1024,
+        'traced_peak_mb': traced_peak / 1e6,
+    })
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--lines', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, 'serializer-bench.pdf')
+        build_pdf(CorpusSpec('serializer', args.pages, args.lines, MIXED_FONTS, 0.0), pdf_path)
+
+        context = multiprocessing.get_context('spawn')
+        rows = []
+        for variant in ('strings', 'xmlfile-pretty', 'xmlfile-compact'):
+            results = context.Queue()
+            process = context.Process(target=_run_variant, args=(variant, pdf_path, args.repeat, results))
+            process.start()
+            rows.append(results.get())
+            process.join()
+
+    print(f"{args.pages} pages x {args.lines} lines, mean of {args.repeat} runs")
+    print(f"{'variant':<17}{'output MB':>10}{'seconds':>9}{'MB/s':>8}{'RSS growth MB':>15}{'traced peak MB':>16}")
+    for row in rows:
+        print(f"{row['variant']:<17}{row['bytes'] / 1e6:>10.2f}{row['seconds']:>9.3f}{row['throughput_mb_s']:>8.1f}"
+              f"{row['peak_rss_growth_mb']:>15.1f}{row['traced_peak_mb']:>16.1f}")
+    return rows
+
+if __name__ == '__main__':
+    main()
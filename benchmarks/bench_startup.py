@@ -0,0 +1,73 @@
+"""
+Cold start benchmark: the time a fresh process needs to import the WSGI entry point
+(main.app, what every gunicorn worker and autoscale instance does first) and to answer
+its first request, and which heavy converter dependencies are loaded by then.
+
+    python -m benchmarks.bench_startup --repeat 10
+
+--repo runs the same measurement against another checkout, e.g. an older revision:
+
+    git worktree add /tmp/before <revision>
+    python -m benchmarks.bench_startup --repo /tmp/before
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules the web process should only load once a conversion or XML read needs them
+HEAVY_MODULES = ('pdfminer', 'lxml', 'numpy', 'reportlab')
+
+# Runs in a fresh interpreter in the checkout under test, prints its timings as JSON
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+response = main.app.test_client().get('/login')
+served = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({'import': imported - start, 'first_request': served - imported,
+                  'heavy': [name for name in %r if name in sys.modules]}))
+"""
+
+def _run_child(repo, env):
+    output = subprocess.run([sys.executable, '-c', CHILD % (HEAVY_MODULES,)], cwd=repo, env=env,
+                            check=True, capture_output=True, text=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=10, help='fresh processes to start')
+    parser.add_argument('--repo', default=ROOT, help='checkout to measure (default: this one)')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ,
+                   DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'startup.db')}",
+                   UPLOAD_FOLDER=os.path.join(tmp, 'uploads'),
+                   ARTIFACT_FOLDER=os.path.join(tmp, 'artifacts'),
+                   CONVERSION_WORKERS='0')
+        # The tables exist before the first measured start, as they do after a deployment's init step
+        subprocess.run([sys.executable, '-c', 'from app import create_app, init_db\n'
+                        'app = create_app()\nwith app.app_context(): init_db()'],
+                       cwd=ROOT, env=env, check=True, capture_output=True)
+        # One unmeasured start compiles the bytecode of the checkout under test
+        _run_child(args.repo, env)
+        samples = [_run_child(args.repo, env) for _ in range(args.repeat)]
+
+    imports = [sample['import'] * 1000 for sample in samples]
+    first_requests = [sample['first_request'] * 1000 for sample in samples]
+    print(f"{args.repo}, {args.repeat} starts")
+    print(f"{'stage':<16}{'median ms':>11}{'min ms':>9}")
+    print(f"{'import main':<16}{statistics.median(imports):>11.0f}{min(imports):>9.0f}")
+    print(f"{'first request':<16}{statistics.median(first_requests):>11.0f}{min(first_requests):>9.0f}")
+    print(f"heavy modules loaded at startup: {', '.join(samples[-1]['heavy']) or 'none'}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Style table benchmark: output size of a mixed-font document with span styles written
+inline versus referenced from the <styles> table, and the time a downstream consumer
+needs to parse either with lxml.
+
+    python -m benchmarks.bench_styles --pages 50
+"""
+import argparse
+import gzip
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lxml import etree
+
+from benchmarks.corpus import MIXED_FONTS, CorpusSpec, build_pdf
+from pdf_converter import convert_pdf_to_xml
+
+def _parse_seconds(xml, repeat):
+    parser = etree.XMLParser(load_dtd=False, no_network=True, resolve_entities=False)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        etree.fromstring(xml, parser)
+        samples.append(time.perf_counter() - start)
+    return min(samples)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5, help='parse runs per variant')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        spec = CorpusSpec('styles', args.pages, 40, MIXED_FONTS, 0.0)
+        pdf_path = build_pdf(spec, os.path.join(tmp, 'styles.pdf'))
+        outputs = {}
+        for pretty in (True, False):
+            for inline_styles in (True, False):
+                xml = convert_pdf_to_xml(pdf_path, pretty=pretty, inline_styles=inline_styles).encode('utf-8')
+                name = f"{'pretty' if pretty else 'compact'}, {'inline' if inline_styles else 'referenced'}"
+                outputs[name] = xml
+
+    print(f"{args.pages} pages x 40 lines, {len(MIXED_FONTS)} fonts")
+    print(f"{'variant':<22}{'KB':>9}{'gzip KB':>9}{'parse ms':>10}")
+    for name, xml in outputs.items():
+        print(f"{name:<22}{len(xml) / 1024:>9.0f}{len(gzip.compress(xml)) / 1024:>9.0f}"
+              f"{_parse_seconds(xml, args.repeat) * 1000:>10.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Table detection benchmark on dense financial statements: every page of the generated
+documents carries a ruled 12 x 6 statement with a header row (benchmarks/corpus.py).
+Reports detection time per page, glyph throughput and the share of the conversion time
+spent in detection, and checks the detected tables against the known shape.
+
+    python -m benchmarks.bench_tables --pages 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_serializer import NullSink
+from benchmarks.corpus import BODY_FONTS, CorpusSpec, build_pdf
+from pdf_converter import iter_page_layouts, write_document
+from table_detection import _collect_glyphs, detect_tables
+
+# Shape of the statements drawn by corpus._draw_table: a header row and 11 body rows
+EXPECTED_ROWS = 12
+EXPECTED_COLUMNS = 6
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5, help='detection runs per page')
+    args = parser.parse_args(argv)
+
+    spec = CorpusSpec('statements', args.pages, 20, BODY_FONTS, 1.0)
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = build_pdf(spec, os.path.join(tmp, 'statements.pdf'))
+        with open(pdf_path, 'rb') as pdf_file:
+            layouts = [layout for _, layout in iter_page_layouts(pdf_file)]
+
+        page_seconds = []
+        glyphs = 0
+        mismatches = []
+        for number, layout in enumerate(layouts, 1):
+            glyphs += len(_collect_glyphs(layout)[-1])
+            samples = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                tables = detect_tables(layout)
+                samples.append(time.perf_counter() - start)
+            page_seconds.append(min(samples))
+            shapes = [(len(table.rows), len(table.rows[0]), table.header) for table in tables]
+            if shapes != [(EXPECTED_ROWS, EXPECTED_COLUMNS, True)]:
+                mismatches.append(f"page {number}: {shapes}")
+
+        conversion = {}
+        for enabled in (False, True):
+            start = time.perf_counter()
+            write_document(pdf_path, NullSink(), workers=1, detect_tables=enabled)
+            conversion[enabled] = time.perf_counter() - start
+
+    detection = sum(page_seconds)
+    print(f"{args.pages} pages, {glyphs} glyphs")
+    print(f"detection        {statistics.median(page_seconds) * 1000:8.2f} ms/page (median)"
+          f"  {glyphs / detection:10.0f} glyphs/s")
+    print(f"conversion       {conversion[False]:8.2f}s without detection, {conversion[True]:.2f}s with"
+          f"  ({detection / conversion[True]:.1%} in detection)")
+    print(f"tables matching {EXPECTED_ROWS}x{EXPECTED_COLUMNS} with header: "
+          f"{args.pages - len(mismatches)}/{args.pages}")
+    for message in mismatches:
+        print(f"  MISMATCH {message}")
+    return 1 if mismatches else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
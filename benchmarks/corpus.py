@@ -0,0 +1,125 @@
+"""
+Synthetic PDF corpus for the benchmarks, generated with reportlab.
+
+Every document is described by a CorpusSpec so its size, page count, font mix and table
+density are controlled and the files are reproducible from a seed. Generated files are
+cached by spec, so repeated benchmark runs reuse them.
+"""
+import hashlib
+import os
+import random
+from collections import namedtuple
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+CorpusSpec = namedtuple('CorpusSpec', ['name', 'pages', 'lines_per_page', 'fonts', 'table_density'])
+
+# Fonts available in every reportlab install, no embedding required
+BODY_FONTS = ('Times-Roman',)
+MIXED_FONTS = ('Times-Roman', 'Times-Bold', 'Helvetica', 'Helvetica-Oblique', 'Courier')
+
+DEFAULT_CORPUS = (
+    CorpusSpec('small-text', pages=3, lines_per_page=40, fonts=BODY_FONTS, table_density=0.0),
+    CorpusSpec('mixed-fonts', pages=10, lines_per_page=40, fonts=MIXED_FONTS, table_density=0.0),
+    CorpusSpec('tables', pages=10, lines_per_page=20, fonts=BODY_FONTS, table_density=1.0),
+    CorpusSpec('long-report', pages=50, lines_per_page=40, fonts=MIXED_FONTS, table_density=0.2),
+)
+
+QUICK_CORPUS = DEFAULT_CORPUS[:2]
+
+WORDS = ('revenue', 'costs', 'margin', 'quarter', 'forecast', 'balance', 'assets', 'liabilities',
+         'equity', 'contract', 'clause', 'amendment', 'schedule', 'party', 'term', 'notice')
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = 40
+LINE_HEIGHT = 16
+
+def spec_id(spec):
+    """Short stable identifier of a spec, used in cached file names."""
+    return hashlib.sha256(repr(tuple(spec)).encode('utf-8')).hexdigest()[:12]
+
+def _sentence(rng):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(6, 12))]
+    # Characters that have to be escaped in XML
+    words.insert(rng.randint(0, len(words)), rng.choice(('<', '&', '>', '"quoted"', "'single'")))
+    return ' '.join(words)
+
+def _draw_text(pdf, rng, spec, top, lines):
+    y = top
+    for line in range(lines):
+        x = MARGIN
+        # Switch fonts within the line so spans are split as in real documents
+        for word_index, word in enumerate(_sentence(rng).split(' ')):
+            font = spec.fonts[(line + word_index // 3) % len(spec.fonts)]
+            pdf.setFont(font, 9)
+            pdf.drawString(x, y, word)
+            x += pdf.stringWidth(word + ' ', font, 9)
+            if x > PAGE_WIDTH - MARGIN - 60:
+                break
+        y -= LINE_HEIGHT
+    return y
+
+def _draw_table(pdf, rng, top, rows=12, columns=6):
+    """A ruled financial-statement style table with a header row and numeric cells."""
+    column_width = (PAGE_WIDTH - 2 * MARGIN) / columns
+    xs = [MARGIN + column * column_width for column in range(columns + 1)]
+    ys = [top - row * LINE_HEIGHT for row in range(rows + 1)]
+    pdf.setLineWidth(0.5)
+    pdf.grid(xs, ys)
+    for row in range(rows):
+        y = ys[row] - LINE_HEIGHT + 4
+        for column in range(columns):
+            if row == 0:
+                pdf.setFont('Helvetica-Bold', 8)
+                text = 'Item' if column == 0 else f'Q{column} {2020 + column}'
+            elif column == 0:
+                pdf.setFont('Helvetica', 8)
+                text = rng.choice(WORDS).title()
+            else:
+                pdf.setFont('Helvetica', 8)
+                text = f'{rng.uniform(-5e5, 5e6):,.2f}'
+            pdf.drawString(xs[column] + 3, y, text)
+    return ys[-1] - LINE_HEIGHT
+
+def build_pdf(spec, path, seed=0, variant=None, amended_pages=()):
+    """
+    Write the document described by spec to path.
+    A variant label changes the document metadata but not its pages, which gives a PDF
+    with identical content but a different SHA-256 (useful to defeat the conversion cache).
+    Pages in amended_pages (1-based) get different text, like a revised contract; every
+    other page is identical to the unamended document.
+    """
+    pdf = canvas.Canvas(path, pagesize=A4, invariant=1)
+    pdf.setTitle(spec.name)
+    if variant is not None:
+        pdf.setSubject(f'variant {variant}')
+    for page in range(spec.pages):
+        # Seeded per page so amending one page leaves the others untouched
+        revision = 'amended' if page + 1 in amended_pages else 'original'
+        rng = random.Random(f'{spec.name}-{seed}-{page}-{revision}')
+        top = PAGE_HEIGHT - MARGIN
+        with_table = rng.random() < spec.table_density
+        if with_table:
+            # Short introduction, the table, then body text below it
+            top = _draw_text(pdf, rng, spec, top, 3)
+            top = _draw_table(pdf, rng, top)
+        remaining = int((top - MARGIN) // LINE_HEIGHT)
+        _draw_text(pdf, rng, spec, top, min(spec.lines_per_page, remaining))
+        pdf.setFont('Helvetica', 8)
+        pdf.drawString(PAGE_WIDTH / 2, MARGIN / 2, str(page + 1))
+        pdf.showPage()
+    pdf.save()
+    return path
+
+def ensure_corpus(directory, specs=DEFAULT_CORPUS):
+    """Generate any missing corpus files in directory and return {spec.name: path}."""
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for spec in specs:
+        path = os.path.join(directory, f'{spec.name}-{spec_id(spec)}.pdf')
+        if not os.path.exists(path):
+            build_pdf(spec, path + '.tmp')
+            os.replace(path + '.tmp', path)
+        paths[spec.name] = path
+    return paths
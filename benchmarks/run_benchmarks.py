@@ -0,0 +1,298 @@
+"""
+Benchmark suite for the conversion pipeline.
+
+Each document of the synthetic corpus (benchmarks/corpus.py) is run through three stages:
+
+    extract     pdfminer parsing and layout analysis (iter_page_layouts)
+    serialize   XML serialization of pages already built into the document model (DocumentWriter)
+    end_to_end  upload to /dashboard through the Flask test client, wait for the
+                background job, download the XML
+
+For every stage and document the suite records p50/p99 latency, throughput in pages/s and
+PDF MB/s, and the peak Python heap measured with tracemalloc in a separate run (process
+pool workers used for long documents are not traced). Results are compared against a
+stored baseline and the run exits with status 1 when a stage regressed beyond --tolerance.
+
+    python -m benchmarks.run_benchmarks                  # full corpus, compare to baseline
+    python -m benchmarks.run_benchmarks --quick          # two small documents
+    python -m benchmarks.run_benchmarks --update-baseline
+
+Baselines are machine specific: regenerate benchmarks/baseline.json with --update-baseline
+on the machine that runs the comparison.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from benchmarks.bench_serializer import NullSink
+from benchmarks.corpus import DEFAULT_CORPUS, QUICK_CORPUS, build_pdf, ensure_corpus
+from pdf_converter import iter_page_layouts, iter_pages
+from xml_serializer import DocumentWriter
+
+STAGES = ('extract', 'serialize', 'end_to_end')
+
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+DEFAULT_CORPUS_DIR = os.path.join(BENCHMARK_DIR, 'corpus-cache')
+
+# Differences below these are treated as noise even when they exceed the tolerance
+MIN_TIME_DELTA = 0.05
+MIN_MEMORY_DELTA_MB = 1.0
+
+# Seconds between status polls while waiting for a background conversion
+POLL_INTERVAL = 0.01
+END_TO_END_TIMEOUT = 600
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples."""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def _metadata(pdf_path):
+    return {'creation_date': '2026-01-01T00:00:00', 'file_size': os.path.getsize(pdf_path), 'content_sample': ''}
+
+# Stages are set up once per document; prepare() returns the callable that is measured
+
+class ExtractStage:
+    """pdfminer parsing and layout analysis of every page."""
+    name = 'extract'
+
+    def setup(self, spec, pdf_path):
+        self.pdf_path = pdf_path
+
+    def prepare(self):
+        return self.run
+
+    def run(self):
+        with open(self.pdf_path, 'rb') as pdf_file:
+            for _ in iter_page_layouts(pdf_file):
+                pass
+
+class SerializeStage:
+    """Serialization of pages that were laid out and built once during setup."""
+    name = 'serialize'
+
+    def setup(self, spec, pdf_path):
+        with open(pdf_path, 'rb') as pdf_file:
+            self.pages = [page for _, page in iter_pages(pdf_file)]
+        self.metadata = _metadata(pdf_path)
+
+    def prepare(self):
+        return self.run
+
+    def run(self):
+        with DocumentWriter(NullSink(), self.metadata) as writer:
+            for page in self.pages:
+                writer.write_page(page)
+                writer.flush()
+
+class EndToEndStage:
+    """Upload, background conversion and download through the real Flask app."""
+    name = 'end_to_end'
+
+    def __init__(self, workdir):
+        from app import create_app, init_db
+        from jobs import start_workers
+        logging.getLogger().setLevel(logging.WARNING)
+
+        self.app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+            'UPLOAD_FOLDER': os.path.join(workdir, 'uploads'),
+            'ARTIFACT_FOLDER': os.path.join(workdir, 'artifacts'),
+            'WTF_CSRF_ENABLED': False,
+            # Every run uploads the same pages under the same name, which incremental conversion
+            # would copy from the previous run instead of converting them
+            'INCREMENTAL_CONVERSION': False,
+        })
+        with self.app.app_context():
+            init_db()
+        start_workers(self.app)
+        self.client = self.app.test_client()
+        self.client.post('/register', data={'username': 'bench', 'email': 'bench@example.com',
+                                            'password': 'benchmark', 'confirm_password': 'benchmark'})
+        self.client.post('/login', data={'email': 'bench@example.com', 'password': 'benchmark'})
+        self.workdir = workdir
+        self.variant = 0
+
+    def setup(self, spec, pdf_path):
+        self.spec = spec
+        self.filename = os.path.basename(pdf_path)
+
+    def _next_upload(self):
+        # Same pages with a different hash each run, otherwise the conversion cache answers
+        self.variant += 1
+        path = os.path.join(self.workdir, 'upload.pdf')
+        build_pdf(self.spec, path, variant=self.variant)
+        with open(path, 'rb') as pdf_file:
+            return pdf_file.read()
+
+    def _convert(self, data):
+        response = self.client.post('/dashboard', data={'pdf_file': (BytesIO(data), self.filename)},
+                                    content_type='multipart/form-data')
+        if response.status_code != 302:
+            raise Exception(f"Upload failed with status {response.status_code}")
+        with self.client.session_transaction() as session:
+            conversion_id = session['current_conversion_id']
+
+        deadline = time.monotonic() + END_TO_END_TIMEOUT
+        while True:
+            status = self.client.get(f'/api/conversion/{conversion_id}').get_json()
+            if status['status'] == 'completed':
+                break
+            if status['status'] == 'failed':
+                raise Exception(f"Conversion failed: {status['error']}")
+            if time.monotonic() > deadline:
+                raise Exception(f"Conversion {conversion_id} did not finish in {END_TO_END_TIMEOUT}s")
+            time.sleep(POLL_INTERVAL)
+
+        download = self.client.get(f'/download/{conversion_id}')
+        if download.status_code != 200:
+            raise Exception(f"Download failed with status {download.status_code}")
+        return len(download.get_data())
+
+    def prepare(self):
+        # The upload is built outside of the measured region
+        data = self._next_upload()
+        return lambda: self._convert(data)
+
+def _timed_samples(stage, repeat):
+    samples = []
+    for _ in range(repeat):
+        run = stage.prepare()
+        start = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def _peak_memory_mb(stage):
+    run = stage.prepare()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+def run_suite(stage_names, specs, repeat, corpus_dir, workdir):
+    paths = ensure_corpus(corpus_dir, specs)
+    stages = []
+    for name in stage_names:
+        if name == 'extract':
+            stages.append(ExtractStage())
+        elif name == 'serialize':
+            stages.append(SerializeStage())
+        else:
+            stages.append(EndToEndStage(workdir))
+
+    results = {}
+    for spec in specs:
+        pdf_path = paths[spec.name]
+        size_mb = os.path.getsize(pdf_path) / (1024 * 1024)
+        for stage in stages:
+            stage.setup(spec, pdf_path)
+            # Warm-up run: imports, font caches, worker threads and pools
+            stage.prepare()()
+            samples = _timed_samples(stage, repeat)
+            p50 = percentile(samples, 50)
+            results[f'{stage.name}/{spec.name}'] = {
+                'p50': p50,
+                'p99': percentile(samples, 99),
+                'pages_per_s': spec.pages / p50,
+                'mb_per_s': size_mb / p50,
+                'peak_mb': _peak_memory_mb(stage),
+            }
+            print(f"  {stage.name + '/' + spec.name:<28} p50 {p50:.3f}s", file=sys.stderr)
+    return results
+
+def compare(results, baseline, tolerance):
+    """Return a list of regression messages for results that are worse than the baseline."""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        if (current['p50'] > previous['p50'] * (1 + tolerance)
+                and current['p50'] - previous['p50'] > MIN_TIME_DELTA):
+            regressions.append(f"{key}: p50 {current['p50']:.3f}s vs baseline {previous['p50']:.3f}s")
+        if (current['peak_mb'] > previous['peak_mb'] * (1 + tolerance)
+                and current['peak_mb'] - previous['peak_mb'] > MIN_MEMORY_DELTA_MB):
+            regressions.append(f"{key}: peak memory {current['peak_mb']:.1f} MB "
+                               f"vs baseline {previous['peak_mb']:.1f} MB")
+    return regressions
+
+def print_report(results, baseline):
+    print(f"{'benchmark':<28}{'p50 s':>9}{'p99 s':>9}{'pages/s':>10}{'MB/s':>8}{'peak MB':>9}{'vs base':>9}")
+    for key, row in results.items():
+        previous = baseline.get(key)
+        delta = f"{(row['p50'] / previous['p50'] - 1) * 100:+.0f}%" if previous else '-'
+        print(f"{key:<28}{row['p50']:>9.3f}{row['p99']:>9.3f}{row['pages_per_s']:>10.1f}"
+              f"{row['mb_per_s']:>8.2f}{row['peak_mb']:>9.1f}{delta:>9}")
+    print(f"max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stages', default=','.join(STAGES),
+                        help=f"comma separated subset of {', '.join(STAGES)}")
+    parser.add_argument('--quick', action='store_true', help='only run the small documents')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per benchmark')
+    parser.add_argument('--corpus-dir', default=DEFAULT_CORPUS_DIR)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--update-baseline', action='store_true', help='store these results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown or memory growth relative to the baseline (0.25 = 25%%)')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    stage_names = [name.strip() for name in args.stages.split(',') if name.strip()]
+    unknown = set(stage_names) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run_suite(stage_names, QUICK_CORPUS if args.quick else DEFAULT_CORPUS,
+                            args.repeat, args.corpus_dir, workdir)
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+
+    print_report(results, baseline)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(results, output, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'cpus': os.cpu_count(),
+                'results': results,
+            }, baseline_file, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+        for message in regressions:
+            print(f"  REGRESSION {message}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""
+Offline bulk conversion of PDF archives, without the web app, its login or its database:
+
+    python bulk_convert.py archive/ 'scans/**/*.pdf' --output xml/ --workers 8
+
+Inputs are PDF files, directories (searched recursively for *.pdf) or glob patterns.
+The XML of each PDF is written next to it, or with --output into a tree mirroring the
+input directory (the part of a glob before its first wildcard). Inputs whose trees would
+write the same XML file are refused before anything is converted. Files are converted whole,
+one per worker process, and written to a temporary name that is renamed into place.
+
+Every finished file is appended to a JSON lines manifest with the converter options it
+was converted with, so an interrupted run started again with the same arguments skips the
+PDFs already converted (unless they or the options changed since) and retries the ones
+that failed. Progress and the final summary report files/s and input MB/s.
+
+Only pdf_converter and its Flask-free helpers are imported: no Flask, no SQLAlchemy and no
+database setup.
+"""
+import argparse
+import glob
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from pdf_converter import write_document
+
+# Manifest written in the output directory, or in the working directory when converting in place
+MANIFEST_NAME = 'bulk_convert_manifest.jsonl'
+
+# Seconds between progress reports
+PROGRESS_INTERVAL = 10
+
+# Conversions queued per worker, enough to keep the pool busy without listing every future at once
+QUEUED_PER_WORKER = 2
+
+def find_pdfs(inputs):
+    """Expand files, directories and globs into sorted (pdf_path, relative_path) pairs."""
+    found = {}
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            root = pattern
+            paths = glob.glob(os.path.join(glob.escape(pattern), '**', '*'), recursive=True)
+        elif glob.has_magic(pattern):
+            # The directory part before the first wildcard is the root of the output tree
+            parts = pattern.split(os.sep)[:-1]
+            root = os.sep.join(itertools.takewhile(lambda part: not glob.has_magic(part), parts))
+            root = root or (os.sep if pattern.startswith(os.sep) else '.')
+            paths = glob.glob(pattern, recursive=True)
+        else:
+            root = os.path.dirname(pattern) or '.'
+            paths = [pattern]
+        for path in paths:
+            if path.lower().endswith('.pdf') and os.path.isfile(path):
+                found.setdefault(os.path.abspath(path), os.path.relpath(path, root))
+    return sorted(found.items())
+
+def xml_path_for(pdf_path, relative_path, output_dir):
+    """Where the XML of pdf_path is written."""
+    if output_dir is None:
+        return os.path.splitext(pdf_path)[0] + '.xml'
+    return os.path.join(os.path.abspath(output_dir), os.path.splitext(relative_path)[0] + '.xml')
+
+def plan_outputs(pdfs, output_dir):
+    """
+    Pair the (pdf_path, relative_path) pairs with the XML path of each PDF. Raises when
+    several PDFs would be written to the same XML file, e.g. a/doc.pdf and b/doc.pdf given
+    as the inputs a/ and b/ with one --output directory.
+    """
+    planned = [(pdf_path, xml_path_for(pdf_path, relative_path, output_dir)) for pdf_path, relative_path in pdfs]
+    sources = {}
+    for pdf_path, xml_path in planned:
+        sources.setdefault(xml_path, []).append(pdf_path)
+    collisions = [f"{xml_path} <- {', '.join(pdf_paths)}"
+                  for xml_path, pdf_paths in sorted(sources.items()) if len(pdf_paths) > 1]
+    if collisions:
+        raise Exception(f"Several PDFs would be converted to the same XML file, convert them into "
+                        f"separate --output directories: {'; '.join(collisions)}")
+    return planned
+
+def load_manifest(manifest_path):
+    """Entries of an earlier run, {pdf_path: entry}; later lines win over earlier ones."""
+    entries = {}
+    if not os.path.exists(manifest_path):
+        return entries
+    with open(manifest_path, encoding='utf-8') as manifest:
+        for line in manifest:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A line cut short when the previous run was killed
+                continue
+            entries[entry['pdf']] = entry
+    return entries
+
+def is_done(entry, pdf_path, options):
+    """
+    Whether a manifest entry records a successful conversion of the current pdf_path with
+    the given converter options.
+    """
+    if entry is None or entry['status'] != 'ok' or entry.get('options') != options:
+        return False
+    if not os.path.exists(entry['xml']):
+        return False
+    stat = os.stat(pdf_path)
+    return entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns
+
+def convert_file(pdf_path, xml_path, options):
+    """
+    Process pool task: convert one PDF to xml_path with the converter options (pretty,
+    detect_tables, inline_styles). Returns the manifest entry, with status 'failed' and
+    the error instead of raising.
+    """
+    stat = os.stat(pdf_path)
+    entry = {'pdf': pdf_path, 'xml': xml_path, 'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'options': options}
+    partial_path = xml_path + '.part'
+    start = time.perf_counter()
+    try:
+        os.makedirs(os.path.dirname(xml_path) or '.', exist_ok=True)
+        with open(partial_path, 'wb') as sink:
+            # One process per file already, so each document is converted in-process
+            write_document(pdf_path, sink, workers=1, **options)
+        os.replace(partial_path, xml_path)
+        entry.update(status='ok', xml_size=os.path.getsize(xml_path))
+    except Exception as e:
+        entry.update(status='failed', error=f"{type(e).__name__}: {e}")
+    finally:
+        if os.path.exists(partial_path):
+            os.unlink(partial_path)
+    entry['seconds'] = round(time.perf_counter() - start, 3)
+    return entry
+
+def _init_worker():
+    # pdfminer logs every operator at DEBUG, which slows conversion down several times
+    logging.getLogger('pdfminer').setLevel(logging.WARNING)
+
+class Progress:
+    """Counts finished files and input bytes, and logs the throughput."""
+
+    def __init__(self, total_files, total_bytes):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.files = 0
+        self.bytes = 0
+        self.failed = 0
+        self.start = time.perf_counter()
+        self.last_report = self.start
+
+    def add(self, entry):
+        self.files += 1
+        self.bytes += entry['size']
+        if entry['status'] != 'ok':
+            self.failed += 1
+            logging.warning(f"Failed to convert {entry['pdf']}: {entry['error']}")
+        if time.perf_counter() - self.last_report >= PROGRESS_INTERVAL:
+            self.report()
+
+    def report(self, final=False):
+        self.last_report = time.perf_counter()
+        seconds = max(self.last_report - self.start, 1e-9)
+        logging.info(f"{'Converted' if final else 'Progress:'} {self.files}/{self.total_files} files, "
+                     f"{self.bytes / 1e6:.1f}/{self.total_bytes / 1e6:.1f} MB in {seconds:.1f}s "
+                     f"({self.files / seconds:.2f} files/s, {self.bytes / 1e6 / seconds:.2f} MB/s), "
+                     f"{self.failed} failed")
+
+def run(pdfs, output_dir, manifest_path, workers, pretty=True, detect_tables=True, inline_styles=False):
+    """
+    Convert the (pdf_path, relative_path) pairs not yet recorded in the manifest on a pool
+    of `workers` processes. Returns the Progress of the run.
+    """
+    done = load_manifest(manifest_path)
+    options = {'pretty': pretty, 'detect_tables': detect_tables, 'inline_styles': inline_styles}
+    pending = [(pdf_path, xml_path) for pdf_path, xml_path in plan_outputs(pdfs, output_dir)
+               if not is_done(done.get(pdf_path), pdf_path, options)]
+    logging.info(f"{len(pdfs)} PDFs found, {len(pdfs) - len(pending)} already converted, "
+                 f"converting {len(pending)} on {workers} workers")
+
+    progress = Progress(len(pending), sum(os.path.getsize(pdf_path) for pdf_path, _ in pending))
+    if not pending:
+        return progress
+
+    os.makedirs(os.path.dirname(os.path.abspath(manifest_path)), exist_ok=True)
+    queue = iter(pending)
+    with open(manifest_path, 'a', encoding='utf-8') as manifest, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                initializer=_init_worker) as executor:
+        running = set()
+        try:
+            while True:
+                for pdf_path, xml_path in queue:
+                    running.add(executor.submit(convert_file, pdf_path, xml_path, options))
+                    if len(running) >= workers * QUEUED_PER_WORKER:
+                        break
+                if not running:
+                    break
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    entry = future.result()
+                    manifest.write(json.dumps(entry) + '\n')
+                    manifest.flush()
+                    progress.add(entry)
+        except KeyboardInterrupt:
+            # Finished files are in the manifest already; the next run picks up the rest
+            for future in running:
+                future.cancel()
+            logging.warning("Interrupted, rerun with the same arguments to resume")
+            raise
+    progress.report(final=True)
+    return progress
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+', help='PDF files, directories or glob patterns')
+    parser.add_argument('--output', '-o', help='directory for the XML files (default: next to each PDF)')
+    parser.add_argument('--manifest', help=f'resume manifest (default: {MANIFEST_NAME} in the output '
+                                           f'directory, or in the working directory)')
+    parser.add_argument('--workers', '-j', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--compact', action='store_true', help='write XML without indentation')
+    parser.add_argument('--no-tables', action='store_true', help='keep tables as plain text blocks')
+    parser.add_argument('--inline-styles', action='store_true',
+                        help='write the font attributes on every span instead of a <styles> table')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    _init_worker()
+
+    manifest_path = args.manifest or os.path.join(args.output or '.', MANIFEST_NAME)
+    pdfs = find_pdfs(args.inputs)
+    if not pdfs:
+        parser.error("no PDF files found")
+    try:
+        plan_outputs(pdfs, args.output)
+    except Exception as e:
+        parser.error(str(e))
+    try:
+        progress = run(pdfs, args.output, manifest_path, max(args.workers, 1), pretty=not args.compact,
+                       detect_tables=not args.no_tables, inline_styles=args.inline_styles)
+    except KeyboardInterrupt:
+        return 130
+    return 1 if progress.failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
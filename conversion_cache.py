@@ -0,0 +1,168 @@
+import hashlib
+import json
+import logging
+import threading
+from datetime import datetime
+from functools import partial
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models import Conversion, XmlArtifact
+import artifact_store
+import metrics
+
+# Process-local hit/miss counters, the per-artifact hit_count column is the persistent view
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+_stats_lock = threading.Lock()
+
+CACHE_EVENTS = metrics.Counter('pdf_converter_cache_events_total',
+                               'Conversion cache hits, misses and evictions in this process', ['event'])
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+def _collect_cache_stats():
+    for name, value in cache_stats().items():
+        CACHE_EVENTS.set_total(value, event=name)
+
+def cache_stats():
+    """Return a snapshot of this process's cache counters."""
+    with _stats_lock:
+        return dict(_stats)
+
+metrics.register_collector(_collect_cache_stats)
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file on disk, read in chunks so large PDFs never sit in memory."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as pdf_file:
+        for chunk in iter(lambda: pdf_file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def converter_options():
+    """Options of the configured converter that change its output, part of every cache key."""
+    return {
+        'pretty': current_app.config['XML_PRETTY_PRINT'],
+        'detect_tables': current_app.config['XML_DETECT_TABLES'],
+        'inline_styles': current_app.config['XML_INLINE_STYLES'],
+    }
+
+def cache_key(pdf_sha256, options=None):
+    """Key a conversion by the PDF bytes, the converter version and the options that shape the output."""
+    from pdf_converter import CONVERTER_VERSION
+    payload = json.dumps({
+        'pdf': pdf_sha256,
+        'version': CONVERTER_VERSION,
+        'options': options or {},
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def output_format(options=None):
+    """Identify the converter version and options, pages are only reused between equal formats."""
+    from pdf_converter import CONVERTER_VERSION
+    payload = json.dumps({'version': CONVERTER_VERSION, 'options': options or {}}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+def lookup(key):
+    """Return the cached artifact for key and mark it as recently used, or None on a miss."""
+    artifact = XmlArtifact.query.filter_by(cache_key=key).first()
+    if artifact is None:
+        _count('misses')
+        return None
+
+    _count('hits')
+    XmlArtifact.query.filter_by(id=artifact.id).update(
+        {'hit_count': XmlArtifact.hit_count + 1, 'last_used_at': datetime.utcnow()},
+        synchronize_session=False)
+    return artifact
+
+def store(key, pdf_sha256, xml_chunks, options=None, page_index=None):
+    """
+    Write freshly converted XML (an iterable of UTF-8 bytes chunks) to the artifact store
+    under key and return the artifact.
+    page_index is the list iter_converted_xml fills while the chunks are consumed.
+    If another worker stored the same key first, its artifact is returned instead and the
+    XML written here is removed.
+    """
+    stored = artifact_store.write_artifact(xml_chunks)
+    artifact = XmlArtifact(
+        cache_key=key,
+        pdf_sha256=pdf_sha256,
+        digest=stored.digest,
+        storage_path=stored.storage_path,
+        compression=stored.compression,
+        size=stored.size,
+        page_index={'format': output_format(options), 'pages': page_index} if page_index else None,
+    )
+    try:
+        with db.session.begin_nested():
+            db.session.add(artifact)
+    except IntegrityError:
+        artifact = XmlArtifact.query.filter_by(cache_key=key).one()
+        # Identical XML shares the winner's file, only a differing one is left over
+        if not XmlArtifact.query.filter_by(storage_path=stored.storage_path).first():
+            artifact_store.delete_artifact(stored.storage_path)
+
+    evict(current_app.config['CONVERSION_CACHE_MAX_BYTES'], keep_id=artifact.id)
+    return artifact
+
+def previous_fragments(conversion, options=None, candidates=3):
+    """
+    Return PageFragments of the latest earlier conversion of a PDF with the same name by the
+    same user, i.e. an earlier revision of the document, or None if there is none whose XML
+    has a page index in the current output format.
+    """
+    from pdf_converter import PageFragments
+    earlier = (Conversion.query
+               .filter(Conversion.user_id == conversion.user_id,
+                       Conversion.pdf_filename == conversion.pdf_filename,
+                       Conversion.id != conversion.id,
+                       Conversion.status == 'completed',
+                       Conversion.artifact_id.isnot(None))
+               .order_by(Conversion.id.desc())
+               .limit(candidates))
+    expected = output_format(options)
+    for candidate in earlier:
+        artifact = candidate.artifact
+        index = artifact.page_index
+        if index and index.get('format') == expected:
+            opener = partial(artifact_store.open_artifact, artifact.storage_path, artifact.compression)
+            return PageFragments(opener, index['pages'])
+    return None
+
+def evict(max_bytes, keep_id=None):
+    """
+    Delete the least recently used artifacts that no conversion points at until their XML
+    fits in max_bytes. Referenced artifacts keep their cache key: the history needs their
+    XML anyway, so a hit on them costs no space. keep_id protects the artifact that is
+    about to be attached to a conversion.
+    """
+    unreferenced = (XmlArtifact.query
+                    .filter(~db.session.query(Conversion.id)
+                            .filter(Conversion.artifact_id == XmlArtifact.id).exists()))
+    total = unreferenced.with_entities(db.func.coalesce(db.func.sum(XmlArtifact.size), 0)).scalar()
+    if total <= max_bytes:
+        return 0
+
+    evicted = 0
+    candidates = (unreferenced
+                  .order_by(XmlArtifact.last_used_at)
+                  .with_entities(XmlArtifact.id, XmlArtifact.size, XmlArtifact.storage_path))
+    for artifact_id, size, storage_path in candidates.all():
+        if total <= max_bytes:
+            break
+        if artifact_id == keep_id:
+            continue
+        XmlArtifact.query.filter_by(id=artifact_id).delete(synchronize_session=False)
+        if not XmlArtifact.query.filter_by(storage_path=storage_path).first():
+            artifact_store.delete_artifact(storage_path)
+        total -= size
+        evicted += 1
+
+    _count('evictions', evicted)
+    logging.debug(f"Evicted {evicted} entries from the conversion cache")
+    return evicted
@@ -0,0 +1,45 @@
+"""
+Read replica routing for the SQLAlchemy session.
+
+When DATABASE_REPLICA_URL is configured it is registered as the "replica" bind. Views
+decorated with read_replica (history, the JSON read APIs) and the Flask-Login user
+loader run their SELECTs against it; everything else, including any flush, stays on the
+primary. Without a replica the decorator changes nothing.
+"""
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql import Select
+
+REPLICA_BIND = 'replica'
+
+class RoutingSession(Session):
+    """Session that sends SELECTs issued inside replica_reads() to the replica engine."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and isinstance(clause, Select)
+                and has_app_context() and g.get('read_replica', False)):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@contextmanager
+def replica_reads():
+    """Route the SELECTs of the enclosed block to the replica, if there is one."""
+    previous = g.get('read_replica', False)
+    g.read_replica = True
+    try:
+        yield
+    finally:
+        g.read_replica = previous
+
+def read_replica(view):
+    """Decorator for views that only read: their queries may be served by the replica."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with replica_reads():
+            return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,144 @@
+"""
+Compact intermediate model of a converted document, between pdfminer's layout and the XML.
+
+pdfminer keeps an object per glyph with its matrix, font and graphic state, so a laid out
+page is several MB. build_page() keeps only what the serializer writes: the pages, text
+blocks, lines, runs of text in one style, figures and detected tables, in __slots__ classes
+with interned style tuples. The LTPage can be dropped as soon as its Page is built, which
+keeps the structure of a 1000-page document in tens of MB.
+"""
+import re
+from functools import lru_cache
+
+from pdfminer.layout import LTChar, LTFigure, LTImage, LTTextContainer, LTTextLine
+
+# Subset fonts are embedded with a random six letter prefix, e.g. "ABCDEF+Helvetica"
+SUBSET_PREFIX = re.compile(r'^[A-Z]{6}\+')
+
+@lru_cache(maxsize=4096)
+def font_attributes(fontname, size):
+    """
+    Translate a PDF font name and size into the span styling attributes.
+    Cached, so every span in the same style shares one tuple.
+    """
+    name = SUBSET_PREFIX.sub('', fontname or 'Unknown')
+    family = name.split('-', 1)[0].split(',', 1)[0]
+    lowered = name.lower()
+    attributes = [('font-family', family), ('font-size', f'{size:.2f}')]
+    if 'bold' in lowered or 'black' in lowered or 'heavy' in lowered:
+        attributes.append(('font-weight', 'bold'))
+    if 'italic' in lowered or 'oblique' in lowered:
+        attributes.append(('font-style', 'italic'))
+    return tuple(attributes)
+
+class Box:
+    """Base of the elements that have a bounding box on the page."""
+    __slots__ = ('x0', 'y0', 'x1', 'y1')
+
+    def __init__(self, bbox):
+        self.x0, self.y0, self.x1, self.y1 = bbox
+
+    @property
+    def bbox(self):
+        return self.x0, self.y0, self.x1, self.y1
+
+class Span:
+    """A run of text in one style; style is a tuple of (attribute, value) pairs."""
+    __slots__ = ('style', 'text')
+
+    def __init__(self, style, text):
+        self.style = style
+        self.text = text
+
+class Line(Box):
+    __slots__ = ('spans',)
+
+    def __init__(self, bbox, spans):
+        super().__init__(bbox)
+        self.spans = spans
+
+class TextBlock(Box):
+    __slots__ = ('lines',)
+
+    def __init__(self, bbox, lines):
+        super().__init__(bbox)
+        self.lines = lines
+
+class Figure(Box):
+    """An image or vector figure, kept as its position only."""
+    __slots__ = ()
+
+class Table(Box):
+    """A detected table: rows of cell strings, whether the first row is a header, whether it is ruled."""
+    __slots__ = ('rows', 'header', 'ruled')
+
+    def __init__(self, bbox, rows, header, ruled):
+        super().__init__(bbox)
+        self.rows = rows
+        self.header = header
+        self.ruled = ruled
+
+class Page:
+    """A page and its elements (TextBlock, Figure and Table) in reading order."""
+    __slots__ = ('number', 'width', 'height', 'elements')
+
+    def __init__(self, number, width, height, elements):
+        self.number = number
+        self.width = width
+        self.height = height
+        self.elements = elements
+
+def line_spans(line):
+    """Group the characters of an LTTextLine into (style, text) runs of the same font."""
+    spans = []
+    current_style = None
+    current_text = []
+    for char in line:
+        if isinstance(char, LTChar):
+            style = font_attributes(char.fontname, char.size)
+        else:
+            # LTAnno (inferred whitespace) inherits the style of the previous glyph
+            style = current_style
+        if style != current_style and current_text:
+            spans.append((current_style, ''.join(current_text)))
+            current_text = []
+        current_style = style
+        current_text.append(char.get_text())
+    if current_text:
+        spans.append((current_style, ''.join(current_text)))
+    return spans
+
+def _build_line(line):
+    spans = []
+    for style, text in line_spans(line):
+        text = text.rstrip('\n')
+        if text:
+            spans.append(Span(style or (), text))
+    return Line(line.bbox, spans)
+
+def build_page(page_number, layout, tables=None):
+    """
+    Build the Page of a pdfminer LTPage. tables are the page's DetectedTables; each one
+    takes the place of the first layout element it covers, the others it covers are left out.
+    """
+    table_at = {}
+    covered = set()
+    for table in tables or ():
+        table_at[min(table.elements)] = table
+        covered |= table.elements
+
+    elements = []
+    for element_index, element in enumerate(layout):
+        if element_index in table_at:
+            table = table_at[element_index]
+            elements.append(Table(table.bbox, tuple(tuple(row) for row in table.rows), table.header, table.ruled))
+        elif element_index in covered:
+            continue
+        elif isinstance(element, LTTextContainer):
+            lines = [element] if isinstance(element, LTTextLine) else element
+            elements.append(TextBlock(element.bbox, [_build_line(line) for line in lines
+                                                     if isinstance(line, LTTextLine)]))
+        elif isinstance(element, (LTFigure, LTImage)):
+            # Scanned pages are a single image with no text layer
+            elements.append(Figure(element.bbox))
+    return Page(page_number, layout.width, layout.height, elements)
@@ -1,5 +1,5 @@
 from flask_wtf import FlaskForm
-from flask_wtf.file import FileField, FileRequired, FileAllowed
+from flask_wtf.file import FileField, FileRequired, FileAllowed, MultipleFileField
 from wtforms import StringField, PasswordField, SubmitField, BooleanField
 from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError
 from models import User
@@ -33,3 +33,11 @@ class PDFUploadForm(FlaskForm):
         FileAllowed(['pdf'], 'Only PDF files are allowed!')
     ])
     submit = SubmitField('Convert to XML')
+
+
+class BatchUploadForm(FlaskForm):
+    pdf_files = MultipleFileField('Upload PDFs or ZIP archives', validators=[
+        DataRequired(message='Please select at least one file.'),
+        FileAllowed(['pdf', 'zip'], 'Only PDF and ZIP files are allowed!')
+    ])
+    submit = SubmitField('Convert All')
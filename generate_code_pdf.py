@@ -1,10 +1,89 @@
+"""
+Generate a PDF with the source code of the project.
+
+Every source file is rendered to its own small PDF part, cached under the SHA-256 of its
+content, so a rebuild only renders the files that changed (in parallel when there are
+several) and merges the cached parts into the final document. build_code_pdf skips the
+merge too when the output is already up to date with the sources.
+"""
+import hashlib
+import json
+import multiprocessing
 import os
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Preformatted
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_LEFT
+import tempfile
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+# Bumped whenever the rendering below changes, so cached parts are not reused across versions
+CODE_PDF_VERSION = "2"
+
+# Less source than this is rendered in-process, starting worker processes takes longer
+PARALLEL_MIN_BYTES = 2 * 1024 * 1024
+
+TITLE = "PDF to XML Converter Application - Complete Source Code"
+
+# Files to include in the PDF, in order
+FILES_TO_INCLUDE = [
+    ('app.py', 'Flask Application Configuration'),
+    ('main.py', 'Application Entry Point'),
+    ('models.py', 'Database Models'),
+    ('forms.py', 'Web Form Definitions'),
+    ('routes.py', 'Application Routes'),
+    ('asgi.py', 'ASGI Entry Point'),
+    ('gunicorn.conf.py', 'Gunicorn Settings'),
+    ('migrations.py', 'Database Schema Migrations'),
+    ('db_routing.py', 'Read Replica Routing'),
+    ('uploads.py', 'Upload and Batch Handling'),
+    ('upload_spool.py', 'Upload Spooling'),
+    ('jobs.py', 'Background Conversion Jobs'),
+    ('conversion_cache.py', 'Conversion Cache'),
+    ('artifact_store.py', 'Compressed XML Artifact Store'),
+    ('metrics.py', 'Conversion Metrics'),
+    ('pdf_converter.py', 'PDF to XML Conversion Logic'),
+    ('document_model.py', 'Document Model'),
+    ('table_detection.py', 'Table Detection'),
+    ('xml_serializer.py', 'XML Serializer'),
+    ('bulk_convert.py', 'Command-Line Bulk Converter'),
+    ('generate_code_pdf.py', 'Source Code PDF Generator'),
+    # Benchmarks
+    ('benchmarks/corpus.py', 'Benchmark Corpus'),
+    ('benchmarks/run_benchmarks.py', 'Benchmark Suite'),
+    ('benchmarks/bench_document_model.py', 'Document Model Benchmark'),
+    ('benchmarks/bench_incremental.py', 'Incremental Conversion Benchmark'),
+    ('benchmarks/bench_queries.py', 'Database Query Benchmark'),
+    ('benchmarks/bench_serializer.py', 'Serializer Benchmark'),
+    ('benchmarks/bench_startup.py', 'Startup Benchmark'),
+    ('benchmarks/bench_styles.py', 'Style Table Benchmark'),
+    ('benchmarks/bench_tables.py', 'Table Detection Benchmark'),
+    # JavaScript files
+    ('static/js/main.js', 'Main JavaScript'),
+    ('static/js/pdf_viewer.js', 'PDF Viewer JavaScript'),
+    ('static/js/xml_viewer.js', 'XML Viewer JavaScript'),
+    # Template files
+    ('templates/base.html', 'Base HTML Template'),
+    ('templates/index.html', 'Index Page Template'),
+    ('templates/login.html', 'Login Page Template'),
+    ('templates/register.html', 'Registration Page Template'),
+    ('templates/dashboard.html', 'Dashboard Page Template'),
+    ('templates/batch.html', 'Batch Upload Page Template'),
+    ('templates/history.html', 'History Page Template'),
+    ('static/download_pdf.html', 'Source Code PDF Download Page'),
+    # CSS file
+    ('static/css/style.css', 'CSS Stylesheet'),
+    # Configuration files
+    ('pyproject.toml', 'Python Project Configuration'),
+    ('requirements.txt', 'Python Requirements'),
+    ('.replit', 'Replit Configuration File'),
+]
+
+# Reference to an object of the merged document, see PdfMerger
+_Reference = namedtuple('_Reference', ['number'])
+
+# SHA-256 of the files read so far, {path: (mtime_ns, size, digest)}
+_file_digests = {}
+_build_lock = threading.Lock()
 
 def get_file_content(filepath):
     """Read the content of a file."""
@@ -14,18 +93,50 @@ def get_file_content(filepath):
     except Exception as e:
         return f"Error reading file: {str(e)}"
 
-def generate_code_pdf(output_pdf="pdf_to_xml_converter_code.pdf"):
-    """Generate a PDF with all code files from the project."""
-    # Setup document
-    doc = SimpleDocTemplate(output_pdf, pagesize=A4, 
-                           rightMargin=72, leftMargin=72,
-                           topMargin=72, bottomMargin=18)
-    
-    # Define styles
+def file_digest(filepath):
+    """SHA-256 of a file's content, only read again when its size or modification time changes."""
+    stat = os.stat(filepath)
+    cached = _file_digests.get(filepath)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    with open(filepath, 'rb') as file:
+        digest = hashlib.file_digest(file, 'sha256').hexdigest()
+    _file_digests[filepath] = (stat.st_mtime_ns, stat.st_size, digest)
+    return digest
+
+def part_keys(root='.', files=FILES_TO_INCLUDE):
+    """Cache key of every part of the document, in order: the title, then one per existing file."""
+    keys = [('title', hashlib.sha256(f"{CODE_PDF_VERSION}:title".encode()).hexdigest(), None, None)]
+    for filepath, description in files:
+        full_path = os.path.join(root, filepath)
+        if os.path.exists(full_path):
+            payload = json.dumps([CODE_PDF_VERSION, filepath, description, file_digest(full_path)])
+            keys.append(('file', hashlib.sha256(payload.encode()).hexdigest(), filepath, description))
+    return keys
+
+def _build(part_path, content):
+    """Lay out flowables into part_path, written under a temporary name and renamed into place."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate
+
+    descriptor, temporary_path = tempfile.mkstemp(suffix='.pdf', dir=os.path.dirname(part_path))
+    os.close(descriptor)
+    try:
+        doc = SimpleDocTemplate(temporary_path, pagesize=A4,
+                                rightMargin=72, leftMargin=72,
+                                topMargin=72, bottomMargin=18)
+        doc.build(content)
+        os.replace(temporary_path, part_path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.unlink(temporary_path)
+
+def _styles():
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_LEFT
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+
     styles = getSampleStyleSheet()
-    title_style = styles['Heading1']
-    subtitle_style = styles['Heading2']
-    
     # Create a code style
     code_style = ParagraphStyle(
         'CodeStyle',
@@ -37,93 +148,214 @@ def generate_code_pdf(output_pdf="pdf_to_xml_converter_code.pdf"):
         textColor=colors.black,
         alignment=TA_LEFT,
     )
-    
-    # Content to add to the PDF
-    content = []
-    
-    # Add title
-    content.append(Paragraph("PDF to XML Converter Application - Complete Source Code", title_style))
-    content.append(Spacer(1, 0.25*inch))
-    
-    # Add project overview
+    return styles, code_style
+
+def render_title_part(part_path):
+    """Render the title and project overview."""
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Paragraph, Spacer
+
+    styles, _ = _styles()
     overview = """
     This document contains the complete source code for a PDF to XML Converter web application
     built with Flask, SQLAlchemy, and vanilla JavaScript. The application allows users to:
-    
+
     • Register and login with authentication
     • Upload PDF documents
     • Convert PDFs to structured XML
     • View and download the XML output
     • Track conversion history
     """
-    content.append(Paragraph(overview, styles['Normal']))
-    content.append(Spacer(1, 0.5*inch))
-    
-    # Files to include in the PDF
-    files_to_include = [
-        ('app.py', 'Flask Application Configuration'),
-        ('main.py', 'Application Entry Point'),
-        ('models.py', 'Database Models'),
-        ('forms.py', 'Web Form Definitions'),
-        ('routes.py', 'Application Routes'),
-        ('pdf_converter.py', 'PDF to XML Conversion Logic'),
-    ]
-    
-    # JavaScript files
-    js_files = [
-        ('static/js/main.js', 'Main JavaScript'),
-        ('static/js/pdf_viewer.js', 'PDF Viewer JavaScript'),
-    ]
-    
-    # Additional template files if they exist
-    template_files = [
-        ('templates/base.html', 'Base HTML Template'),
-        ('templates/index.html', 'Index Page Template'),
-        ('templates/login.html', 'Login Page Template'),
-        ('templates/register.html', 'Registration Page Template'),
-        ('templates/dashboard.html', 'Dashboard Page Template'),
-        ('templates/history.html', 'History Page Template'),
-    ]
-    
-    # Add CSS file if it exists
-    css_files = [
-        ('static/css/style.css', 'CSS Stylesheet'),
-    ]
-    
-    # Configuration files
-    config_files = [
-        ('pyproject.toml', 'Python Project Configuration'),
-        ('.replit', 'Replit Configuration File'),
-    ]
-    
-    # Combine all files
-    all_files = files_to_include + js_files + template_files + css_files + config_files
-    
-    # Add each file's content to the PDF
-    for filepath, description in all_files:
-        if os.path.exists(filepath):
-            # Add file header
-            content.append(Paragraph(f"{description}: {filepath}", subtitle_style))
-            content.append(Spacer(1, 0.1*inch))
-            
-            # Add code with syntax highlighting if available
-            code = get_file_content(filepath)
-            pre_text = Preformatted(code, code_style)
-            content.append(pre_text)
-            
-            # Add spacer
-            content.append(Spacer(1, 0.3*inch))
-    
-    # Add timestamp
-    from datetime import datetime
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    content.append(Paragraph(f"Generated on: {timestamp}", styles['Normal']))
-    
-    # Build the PDF
-    doc.build(content)
-    
+    _build(part_path, [
+        Paragraph(TITLE, styles['Heading1']),
+        Spacer(1, 0.25*inch),
+        Paragraph(overview, styles['Normal']),
+    ])
+
+def render_file_part(part_path, filepath, description, code):
+    """Render one source file, starting on a new page."""
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Paragraph, Preformatted, Spacer
+
+    styles, code_style = _styles()
+    _build(part_path, [
+        Paragraph(f"{description}: {filepath}", styles['Heading2']),
+        Spacer(1, 0.1*inch),
+        Preformatted(code, code_style),
+    ])
+
+def render_footer_part(part_path, timestamp):
+    from reportlab.platypus import Paragraph
+
+    styles, _ = _styles()
+    _build(part_path, [Paragraph(f"Generated on: {timestamp}", styles['Normal'])])
+
+def _pdf_name(name):
+    """Write a name object, escaping the characters PDF does not allow in names."""
+    return b'/' + b''.join(bytes([byte]) if 0x21 <= byte <= 0x7e and byte not in b'()<>[]{}/%#'
+                           else b'#%02X' % byte for byte in name.encode('utf-8'))
+
+class PdfMerger:
+    """
+    Concatenates the pages of PDFs read with pdfminer into a new document. Objects reachable
+    from each page are copied with new numbers, streams keep their compressed data.
+    """
+
+    def __init__(self):
+        # Serialized object bodies, index + 1 is the object number
+        self.objects = []
+        self.pages = []
+        self.pages_number = self._allocate()
+
+    def _allocate(self, body=None):
+        self.objects.append(body)
+        return len(self.objects)
+
+    def add(self, pdf_path):
+        from pdfminer.pdfdocument import PDFDocument
+        from pdfminer.pdfpage import PDFPage
+        from pdfminer.pdfparser import PDFParser
+
+        with open(pdf_path, 'rb') as pdf_file:
+            document = PDFDocument(PDFParser(pdf_file))
+            numbers = {}
+            for page in PDFPage.create_pages(document):
+                # Attributes inherited from the page tree are already merged into page.attrs
+                number = numbers[page.pageid] = self._allocate()
+                attrs = dict(page.attrs, Parent=_Reference(self.pages_number))
+                self.objects[number - 1] = self._write(attrs, document, numbers)
+                self.pages.append(number)
+
+    def _write(self, value, document, numbers):
+        from pdfminer.pdftypes import PDFObjRef, PDFStream
+        from pdfminer.psparser import PSLiteral
+
+        if isinstance(value, _Reference):
+            return b'%d 0 R' % value.number
+        if isinstance(value, PDFObjRef):
+            number = numbers.get(value.objid)
+            if number is None:
+                number = numbers[value.objid] = self._allocate()
+                self.objects[number - 1] = self._write(document.getobj(value.objid), document, numbers)
+            return b'%d 0 R' % number
+        if isinstance(value, PDFStream):
+            attrs = {key: item for key, item in value.attrs.items() if key != 'Length'}
+            data = value.get_rawdata()
+            attrs['Length'] = len(data)
+            return self._write(attrs, document, numbers) + b'\nstream\n' + data + b'\nendstream'
+        if isinstance(value, dict):
+            return b'<<' + b' '.join(_pdf_name(key) + b' ' + self._write(item, document, numbers)
+                                     for key, item in value.items()) + b'>>'
+        if isinstance(value, list):
+            return b'[' + b' '.join(self._write(item, document, numbers) for item in value) + b']'
+        if isinstance(value, PSLiteral):
+            return _pdf_name(value.name)
+        if isinstance(value, bytes):
+            return b'<' + value.hex().encode('ascii') + b'>'
+        if isinstance(value, bool):
+            return b'true' if value else b'false'
+        if isinstance(value, int):
+            return b'%d' % value
+        if isinstance(value, float):
+            return (b'%.6f' % value).rstrip(b'0').rstrip(b'.')
+        if value is None:
+            return b'null'
+        raise Exception(f"Cannot copy PDF object of type {type(value).__name__}")
+
+    def write(self, output, title):
+        """Write the merged document to the binary file output."""
+        kids = b' '.join(b'%d 0 R' % number for number in self.pages)
+        self.objects[self.pages_number - 1] = b'<</Type /Pages /Kids [%s] /Count %d>>' % (kids, len(self.pages))
+        catalog_number = self._allocate(b'<</Type /Catalog /Pages %d 0 R>>' % self.pages_number)
+        info_number = self._allocate(b'<</Title %s /Producer (generate_code_pdf.py)>>'
+                                     % self._write(title.encode('utf-8'), None, None))
+
+        offsets = []
+        position = output.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        for number, body in enumerate(self.objects, 1):
+            offsets.append(position)
+            position += output.write(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+        output.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(self.objects) + 1))
+        output.write(b''.join(b'%010d 00000 n \n' % offset for offset in offsets))
+        output.write(b'trailer\n<</Size %d /Root %d 0 R /Info %d 0 R>>\nstartxref\n%d\n%%%%EOF\n'
+                     % (len(self.objects) + 1, catalog_number, info_number, position))
+
+def _render_parts(missing, cache_dir, root, workers):
+    """Render the (kind, key, filepath, description) parts missing from the cache."""
+    tasks = []
+    total_bytes = 0
+    for kind, key, filepath, description in missing:
+        part_path = os.path.join(cache_dir, f'{key}.pdf')
+        if kind == 'title':
+            tasks.append((render_title_part, (part_path,)))
+        else:
+            code = get_file_content(os.path.join(root, filepath))
+            total_bytes += len(code)
+            tasks.append((render_file_part, (part_path, filepath, description, code)))
+
+    if workers > 1 and len(tasks) > 1 and total_bytes >= PARALLEL_MIN_BYTES:
+        # spawn rather than fork: the web process may be running other threads
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)),
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            for future in [executor.submit(function, *args) for function, args in tasks]:
+                future.result()
+    else:
+        for function, args in tasks:
+            function(*args)
+
+def build_code_pdf(output_pdf, cache_dir, root='.', workers=None, files=FILES_TO_INCLUDE):
+    """
+    Bring output_pdf up to date with the source files under root and return the digest
+    of the sources it was built from, which changes whenever the document would. Only the
+    parts missing from cache_dir are rendered, on up to `workers` processes (defaults to the
+    number of CPUs) once there are at least PARALLEL_MIN_BYTES of them.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    keys = part_keys(root, files)
+    digest = hashlib.sha256(' '.join(key for _, key, _, _ in keys).encode()).hexdigest()
+    state_path = output_pdf + '.json'
+
+    with _build_lock:
+        if os.path.exists(output_pdf) and os.path.exists(state_path):
+            with open(state_path, encoding='utf-8') as state_file:
+                try:
+                    if json.load(state_file).get('digest') == digest:
+                        return digest
+                except ValueError:
+                    # Left unreadable by an interrupted build; rebuilding replaces it
+                    pass
+
+        os.makedirs(cache_dir, exist_ok=True)
+        missing = [part for part in keys if not os.path.exists(os.path.join(cache_dir, f'{part[1]}.pdf'))]
+        _render_parts(missing, cache_dir, root, workers)
+
+        merger = PdfMerger()
+        for _, key, _, _ in keys:
+            merger.add(os.path.join(cache_dir, f'{key}.pdf'))
+        with tempfile.TemporaryDirectory(dir=cache_dir) as tmp:
+            footer_path = os.path.join(tmp, 'footer.pdf')
+            render_footer_part(footer_path, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            merger.add(footer_path)
+
+        output_dir = os.path.dirname(os.path.abspath(output_pdf))
+        os.makedirs(output_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile(suffix='.pdf', dir=output_dir, delete=False) as output:
+            merger.write(output, TITLE)
+        os.replace(output.name, output_pdf)
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.json', dir=output_dir,
+                                         delete=False) as state_file:
+            json.dump({'digest': digest, 'parts': len(keys), 'rendered': len(missing)}, state_file)
+        os.replace(state_file.name, state_path)
+    return digest
+
+def generate_code_pdf(output_pdf="pdf_to_xml_converter_code.pdf", cache_dir=None, workers=None):
+    """Generate a PDF with all code files from the project."""
+    if cache_dir is None:
+        cache_dir = os.path.join('instance', 'source_pdf', 'parts')
+    build_code_pdf(output_pdf, cache_dir, workers=workers)
     return output_pdf
 
 if __name__ == "__main__":
     pdf_path = generate_code_pdf()
-    print(f"PDF generated successfully: {pdf_path}")
\ No newline at end of file
+    print(f"PDF generated successfully: {pdf_path}")
@@ -0,0 +1,8 @@
+"""
+Gunicorn settings of the WSGI deployment (`gunicorn -c gunicorn.conf.py main:app`, see .replit).
+"""
+
+def post_worker_init(worker):
+    """Start the background conversion workers in each gunicorn worker process once it has loaded the app."""
+    from jobs import start_workers
+    start_workers(worker.wsgi)
@@ -0,0 +1,268 @@
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import db
+from models import ConversionJob
+import conversion_cache
+import metrics
+
+# Seconds an idle worker sleeps before polling the queue table again
+POLL_INTERVAL = 2.0
+
+# Times a running job's lease is renewed within CONVERSION_JOB_LEASE seconds
+LEASE_RENEWALS = 3
+
+CONVERSIONS = metrics.Counter('pdf_converter_conversions_total', 'Finished conversion jobs', ['status'])
+CONVERSION_SECONDS = metrics.Histogram('pdf_converter_conversion_seconds',
+                                       'Time from claiming a conversion job to finishing it')
+QUEUE_WAIT_SECONDS = metrics.Histogram('pdf_converter_queue_wait_seconds',
+                                       'Time conversion jobs spent queued before a worker claimed them')
+DOCUMENT_BYTES = metrics.Histogram('pdf_converter_document_bytes', 'Size of converted PDFs',
+                                   buckets=metrics.SIZE_BUCKETS)
+XML_BYTES = metrics.Histogram('pdf_converter_xml_bytes', 'Size of the uncompressed XML of converted PDFs',
+                              buckets=metrics.SIZE_BUCKETS)
+PAGES = metrics.Counter('pdf_converter_pages_total',
+                        'Pages written to converted XML, laid out or copied from an earlier revision',
+                        ['source'])
+QUEUE_DEPTH = metrics.Gauge('pdf_converter_jobs', 'Conversion jobs waiting or being processed', ['status'])
+
+_workers = []
+_workers_lock = threading.Lock()
+_wakeup = threading.Event()
+# Jobs the workers of this process are running, whose leases the heartbeat renews
+_running_jobs = set()
+
+def enqueue_conversion(conversion, pdf_path):
+    """
+    Queue a conversion whose PDF has already been saved to pdf_path.
+    The job is added to the current session; the caller commits it together with the
+    Conversion row and then calls notify_workers().
+    """
+    conversion.status = 'queued'
+    job = ConversionJob(conversion=conversion, pdf_path=pdf_path, status='queued')
+    db.session.add(job)
+    return job
+
+def notify_workers():
+    """Wake idle workers in this process so a freshly committed job starts immediately."""
+    _wakeup.set()
+
+def claim_next_job(worker_name, lease):
+    """
+    Atomically move the oldest queued job to 'running' with a lease of `lease` seconds and
+    return its id, or None. The conditional UPDATE makes the claim safe across threads and
+    gunicorn processes sharing the same database.
+    """
+    while True:
+        job = (ConversionJob.query
+               .filter_by(status='queued')
+               .order_by(ConversionJob.id)
+               .first())
+        if job is None:
+            db.session.rollback()
+            return None
+
+        now = datetime.utcnow()
+        claimed = (ConversionJob.query
+                   .filter_by(id=job.id, status='queued')
+                   .update({'status': 'running', 'worker': worker_name, 'started_at': now,
+                            'lease_expires_at': now + timedelta(seconds=lease),
+                            'attempts': ConversionJob.attempts + 1},
+                           synchronize_session=False))
+        db.session.commit()
+        if claimed:
+            return job.id
+        # Another worker won the race for this job, try the next one
+
+def run_job(job_id):
+    """
+    Convert the PDF of a claimed job and record the outcome on the job and its Conversion.
+    Stage timings are added to the Conversion's stage_timings and the metrics.
+    """
+    started = time.perf_counter()
+    job = db.session.get(ConversionJob, job_id)
+    conversion = job.conversion
+    conversion.status = 'running'
+    db.session.commit()
+    if job.started_at is not None and job.created_at is not None:
+        QUEUE_WAIT_SECONDS.observe((job.started_at - job.created_at).total_seconds())
+
+    previous = None
+    with metrics.collect_stages() as stages:
+        try:
+            if conversion.pdf_sha256 is None:
+                with metrics.timed('hash'):
+                    conversion.pdf_sha256 = conversion_cache.hash_file(job.pdf_path)
+                # An open write transaction would hold SQLite's database lock for the whole
+                # conversion, and the other workers' updates would time out waiting for it
+                db.session.commit()
+            options = conversion_cache.converter_options()
+            key = conversion_cache.cache_key(conversion.pdf_sha256, options)
+            # An identical upload may have been converted while this job was queued
+            with metrics.timed('cache_lookup'):
+                artifact = conversion_cache.lookup(key)
+            if artifact is None:
+                # Unchanged pages of an earlier revision of the document are copied from its XML
+                if current_app.config['INCREMENTAL_CONVERSION']:
+                    previous = conversion_cache.previous_fragments(conversion, options)
+                # Stream the XML straight into the compressed artifact store; the converter
+                # reads the PDF from its path so it is never loaded into memory whole
+                from pdf_converter import iter_converted_xml
+                page_index = []
+                xml_chunks = iter_converted_xml(job.pdf_path, page_index=page_index, previous=previous,
+                                                parallel_min_pages=current_app.config['CONVERSION_PARALLEL_MIN_PAGES'],
+                                                **options)
+                artifact = conversion_cache.store(key, conversion.pdf_sha256, xml_chunks,
+                                                  options=options, page_index=page_index)
+                reused = sum(1 for _, _, fingerprint in page_index if previous is not None and fingerprint in previous)
+                PAGES.inc(len(page_index) - reused, source='converted')
+                PAGES.inc(reused, source='reused')
+            conversion.artifact = artifact
+            conversion.status = 'completed'
+            job.status = 'completed'
+        except Exception as e:
+            logging.error(f"Conversion job {job.id} failed: {str(e)}")
+            db.session.rollback()
+            conversion.status = 'failed'
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            if previous is not None:
+                previous.close()
+
+    # Keeps the timings recorded at upload time; the final commit can only go to the histogram
+    conversion.stage_timings = {**(conversion.stage_timings or {}), **metrics.rounded_stages(stages)}
+    job.finished_at = datetime.utcnow()
+    status, pdf_size = job.status, conversion.file_size
+    xml_size = conversion.artifact.size if conversion.artifact is not None else None
+    commit_start = time.perf_counter()
+    db.session.commit()
+    stages['db_commit'] = time.perf_counter() - commit_start
+
+    metrics.observe_stages(stages)
+    CONVERSIONS.inc(status=status)
+    CONVERSION_SECONDS.observe(time.perf_counter() - started)
+    if pdf_size is not None:
+        DOCUMENT_BYTES.observe(pdf_size)
+    if xml_size is not None:
+        XML_BYTES.observe(xml_size)
+
+    try:
+        os.remove(job.pdf_path)
+    except OSError:
+        pass
+
+def renew_leases(job_ids, lease):
+    """Extend the leases of the given running jobs to `lease` seconds from now."""
+    if not job_ids:
+        return 0
+    renewed = (ConversionJob.query
+               .filter(ConversionJob.id.in_(job_ids), ConversionJob.status == 'running')
+               .update({'lease_expires_at': datetime.utcnow() + timedelta(seconds=lease)},
+                       synchronize_session=False))
+    db.session.commit()
+    return renewed
+
+def requeue_stale_jobs(max_attempts):
+    """
+    Put back running jobs whose lease expired because the process running them died.
+    Live processes keep renewing the leases of their jobs, so jobs running elsewhere are
+    left alone. Jobs claimed max_attempts times already are marked failed instead, so a PDF
+    that keeps killing its worker is not retried forever.
+    """
+    stale = ConversionJob.query.filter(ConversionJob.status == 'running',
+                                       # Jobs claimed before leases existed have none
+                                       db.or_(ConversionJob.lease_expires_at.is_(None),
+                                              ConversionJob.lease_expires_at < datetime.utcnow()))
+    exhausted = stale.filter(ConversionJob.attempts >= max_attempts).all()
+    for job in exhausted:
+        job.status = 'failed'
+        job.error = f"Gave up after {job.attempts} attempts"
+        job.finished_at = datetime.utcnow()
+        job.conversion.status = 'failed'
+    requeued = (stale.filter(ConversionJob.attempts < max_attempts)
+                .update({'status': 'queued', 'worker': None, 'lease_expires_at': None},
+                        synchronize_session=False))
+    db.session.commit()
+    if exhausted:
+        logging.warning(f"Failed {len(exhausted)} stale conversion jobs after {max_attempts} attempts")
+        for job in exhausted:
+            try:
+                os.remove(job.pdf_path)
+            except OSError:
+                pass
+    if requeued:
+        logging.warning(f"Requeued {requeued} stale conversion jobs")
+    return requeued
+
+def _collect_queue_depth():
+    """Refresh the job gauge from the job table, run on every /metrics scrape."""
+    counts = dict(db.session.query(ConversionJob.status, db.func.count(ConversionJob.id))
+                  .filter(ConversionJob.status.in_(('queued', 'running')))
+                  .group_by(ConversionJob.status)
+                  .all())
+    for status in ('queued', 'running'):
+        QUEUE_DEPTH.set(counts.get(status, 0), status=status)
+
+metrics.register_collector(_collect_queue_depth)
+
+def _worker_loop(app, worker_name):
+    while True:
+        job_id = None
+        with app.app_context():
+            try:
+                job_id = claim_next_job(worker_name, app.config["CONVERSION_JOB_LEASE"])
+                if job_id is not None:
+                    _running_jobs.add(job_id)
+                    run_job(job_id)
+            except Exception as e:
+                logging.error(f"Conversion worker {worker_name} error: {str(e)}")
+                db.session.rollback()
+            finally:
+                _running_jobs.discard(job_id)
+                db.session.remove()
+        if job_id is None:
+            _wakeup.wait(POLL_INTERVAL)
+            _wakeup.clear()
+
+def _heartbeat_loop(app):
+    """Renew the leases of this process's running jobs and requeue the expired ones of any process."""
+    lease = app.config["CONVERSION_JOB_LEASE"]
+    while True:
+        with app.app_context():
+            try:
+                renew_leases(list(_running_jobs), lease)
+                requeue_stale_jobs(app.config["CONVERSION_MAX_ATTEMPTS"])
+            except Exception as e:
+                logging.error(f"Conversion lease heartbeat error: {str(e)}")
+                db.session.rollback()
+            finally:
+                db.session.remove()
+        time.sleep(lease / LEASE_RENEWALS)
+
+def start_workers(app):
+    """
+    Start the local conversion worker threads and their lease heartbeat once per process.
+    Called by the server hooks of the entry points (gunicorn.conf.py, the lifespan startup of
+    asgi.py, `python main.py`) and by the views that queue jobs, never on import.
+    """
+    with _workers_lock:
+        if _workers:
+            return
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        for index in range(app.config["CONVERSION_WORKERS"]):
+            worker_name = f"{prefix}:{index}"
+            thread = threading.Thread(target=_worker_loop, args=(app, worker_name),
+                                      name=f"conversion-worker-{index}", daemon=True)
+            thread.start()
+            _workers.append(thread)
+        if _workers:
+            thread = threading.Thread(target=_heartbeat_loop, args=(app,), name="conversion-heartbeat", daemon=True)
+            thread.start()
+        logging.info(f"Started {len(_workers)} conversion workers")
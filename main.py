@@ -1,5 +1,18 @@
-from app import app
-import routes  # Import routes to register them
+from werkzeug.serving import is_running_from_reloader
+
+from app import create_app, init_db
+from jobs import start_workers
+
+app = create_app()
 
 if __name__ == "__main__":
+    # The debug server runs this block twice: in the reloader's supervisor process, and in the
+    # child it restarts on every code change, which is the process that serves requests
+    if is_running_from_reloader():
+        start_workers(app)
+    else:
+        # The development server creates missing tables itself; deployments run
+        # `flask --app app init-db` once before starting the web workers
+        with app.app_context():
+            init_db()
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,177 @@
+"""
+Lightweight in-process metrics: counters, gauges and histograms rendered in the
+Prometheus text exposition format by the /metrics route.
+
+Stage timers are collected per conversion with collect_stages(), which the jobs store on
+the Conversion and feed into the stage histogram. This module has no Flask or database
+dependencies so the converter and its worker processes can use it.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# Upper bounds of the document size histogram buckets in bytes, 4 KB to 1 GB
+SIZE_BUCKETS = tuple(4 ** exponent * 1024 for exponent in range(1, 11))
+
+_registry = []
+_collectors = []
+_registry_lock = threading.Lock()
+_local = threading.local()
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            values = dict(self._values)
+        for key in sorted(values):
+            lines.extend(self._render_sample(key, values[key]))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}']
+
+class Counter(_Metric):
+    """A value that only goes up, e.g. the number of finished conversions."""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value, **labels):
+        """Mirror a running total that is counted elsewhere, e.g. by a collector."""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Gauge(_Metric):
+    """A value that is set to the current state, e.g. the number of queued jobs."""
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, with their sum and count."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            # Copied so a concurrent render never sees a half-updated row
+            counts = list(counts)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def _render_sample(self, key, value):
+        counts, total = value
+        lines = [f'{self.name}_bucket{_format_labels(self.labels, key, [("le", _format_value(bound))])} {count}'
+                 for bound, count in zip(self.buckets, counts)]
+        lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}')
+        lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {counts[-1]}')
+        return lines
+
+def register_collector(collector):
+    """
+    Register a callable that refreshes gauges or counters just before every scrape,
+    for values that live elsewhere such as the job table or the cache counters.
+    """
+    with _registry_lock:
+        _collectors.append(collector)
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    with _registry_lock:
+        collectors = list(_collectors)
+        metrics = list(_registry)
+    for collector in collectors:
+        collector()
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+STAGE_SECONDS = Histogram('pdf_converter_stage_seconds',
+                          'Time spent in each conversion stage, per conversion', ['stage'])
+
+@contextmanager
+def collect_stages():
+    """
+    Collect the stage timings recorded by this thread into a dict of stage -> seconds.
+    Nested collections are independent. Timings recorded outside any collection are
+    dropped, so the converter costs nothing extra when it runs outside the app.
+    """
+    previous = getattr(_local, 'stages', None)
+    stages = _local.stages = {}
+    try:
+        yield stages
+    finally:
+        _local.stages = previous
+
+def add_stage_time(stage, seconds):
+    """Add seconds to a stage of the current collection, if there is one."""
+    stages = getattr(_local, 'stages', None)
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+def add_stage_times(stages):
+    """Merge a dict of stage timings, e.g. returned by a worker process, into the current collection."""
+    for stage, seconds in stages.items():
+        add_stage_time(stage, seconds)
+
+@contextmanager
+def timed(stage):
+    """Time the enclosed block as stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_stage_time(stage, time.perf_counter() - start)
+
+def observe_stages(stages):
+    """Record a finished collection in the stage histogram."""
+    for stage, seconds in stages.items():
+        STAGE_SECONDS.observe(seconds, stage=stage)
+
+def rounded_stages(stages):
+    """Stage timings rounded to milliseconds for storage on the Conversion."""
+    return {stage: round(seconds, 3) for stage, seconds in stages.items()}
@@ -0,0 +1,110 @@
+"""
+Versioned schema migrations for databases created by an earlier version of the app.
+
+db.create_all() only creates missing tables, so every column or index added to an existing
+table needs a numbered step here. upgrade(), run by `flask --app app init-db` (see
+app.init_db), applies the steps newer than the version recorded in the schema_version
+table, in order. Steps check the live schema before changing it, which keeps them safe on
+tables create_all() has just created with the current columns. Rows that predate a new
+column keep NULL in it. Tables the first release did not have (xml_artifact, conversion_batch,
+conversion_job) are created whole by create_all() and need no steps.
+"""
+import logging
+
+from sqlalchemy import Column, Integer, MetaData, Table, inspect, select, text
+
+from app import db
+
+# Single row holding the version of the last migration applied to the database
+schema_version = Table('schema_version', MetaData(), Column('version', Integer, nullable=False))
+
+# Key of the PostgreSQL advisory lock that makes concurrent init-db runs wait for each other
+LOCK_KEY = 4021317
+
+# (version, description, step) in the order they are applied; step receives the connection
+MIGRATIONS = []
+
+def migration(version, description):
+    """Register the decorated function as the schema change of the given version."""
+    def register(step):
+        MIGRATIONS.append((version, description, step))
+        return step
+    return register
+
+def _add_column(conn, table_name, column_name):
+    """Add a nullable column of the model's table unless the table has it already."""
+    if any(column['name'] == column_name for column in inspect(conn).get_columns(table_name)):
+        return
+    column = db.metadata.tables[table_name].c[column_name]
+    if not column.nullable:
+        raise Exception(f"Cannot add NOT NULL column {table_name}.{column_name} to existing rows")
+    quote = conn.dialect.identifier_preparer.quote
+    ddl = f"ALTER TABLE {quote(table_name)} ADD COLUMN {quote(column_name)} {column.type.compile(dialect=conn.dialect)}"
+    for foreign_key in column.foreign_keys:
+        ddl += f" REFERENCES {quote(foreign_key.column.table.name)} ({quote(foreign_key.column.name)})"
+    conn.execute(text(ddl))
+
+def _create_index(conn, table_name, index_name):
+    """Create an index of the model's table unless the table has it already."""
+    if any(index['name'] == index_name for index in inspect(conn).get_indexes(table_name)):
+        return
+    index = next(index for index in db.metadata.tables[table_name].indexes if index.name == index_name)
+    index.create(conn)
+
+@migration(1, "conversion cache: conversion.pdf_sha256 and conversion.artifact_id")
+def _conversion_cache(conn):
+    _add_column(conn, 'conversion', 'pdf_sha256')
+    _create_index(conn, 'conversion', 'ix_conversion_pdf_sha256')
+    _add_column(conn, 'conversion', 'artifact_id')
+
+@migration(2, "history pagination: index ix_conversion_user_date_id")
+def _history_index(conn):
+    _create_index(conn, 'conversion', 'ix_conversion_user_date_id')
+
+@migration(3, "batch uploads: conversion.batch_id")
+def _batch_uploads(conn):
+    _add_column(conn, 'conversion', 'batch_id')
+    _create_index(conn, 'conversion', 'ix_conversion_batch_id')
+
+@migration(4, "stage timings: conversion.stage_timings")
+def _stage_timings(conn):
+    _add_column(conn, 'conversion', 'stage_timings')
+
+def upgrade():
+    """
+    Create the missing tables and apply the pending migrations to the database of the
+    current app. Returns the (version, description) of the migrations applied.
+    """
+    # Import models to register their tables
+    import models
+    latest = max(version for version, _, _ in MIGRATIONS)
+    applied = []
+    with db.engine.connect() as conn:
+        if conn.dialect.name == 'postgresql':
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {'key': LOCK_KEY})
+        try:
+            # A database without any table gets the current schema from create_all; one created
+            # before versioning started is at version 0 and gets every step
+            new_database = not inspect(conn).get_table_names()
+            db.metadata.create_all(conn)
+            schema_version.create(conn, checkfirst=True)
+            version = conn.execute(select(schema_version.c.version)).scalar()
+            if version is None:
+                version = latest if new_database else 0
+                conn.execute(schema_version.insert().values(version=version))
+            conn.commit()
+
+            for step_version, description, step in sorted(MIGRATIONS, key=lambda migration: migration[0]):
+                if step_version <= version:
+                    continue
+                logging.info(f"Migrating the database to version {step_version}: {description}")
+                step(conn)
+                conn.execute(schema_version.update().values(version=step_version))
+                conn.commit()
+                applied.append((step_version, description))
+        finally:
+            conn.rollback()
+            if conn.dialect.name == 'postgresql':
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': LOCK_KEY})
+                conn.commit()
+    return applied
@@ -1,5 +1,8 @@
+import uuid
 from datetime import datetime
-from app import db
+from io import BytesIO
+from app import db, invalidate_user
+from artifact_store import open_artifact
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -22,18 +25,107 @@ class User(UserMixin, db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
+@db.event.listens_for(User, 'after_update')
+@db.event.listens_for(User, 'after_delete')
+def _evict_cached_user(mapper, connection, user):
+    """
+    Drop a changed or deleted user from this process's load_user cache when the session
+    flushes it. Other processes (and bulk query updates) see the change once their cached
+    copy expires, after at most USER_CACHE_TTL seconds.
+    """
+    invalidate_user(user.id)
+
 class Conversion(db.Model):
+    # Serves the keyset-paginated history query, see routes.history
+    __table_args__ = (
+        db.Index('ix_conversion_user_date_id', 'user_id', 'conversion_date', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     pdf_filename = db.Column(db.String(255), nullable=False)
     xml_filename = db.Column(db.String(255), nullable=False)
     conversion_date = db.Column(db.DateTime, default=datetime.utcnow)
     file_size = db.Column(db.Integer, nullable=True)  # Size in bytes
     status = db.Column(db.String(50), default='completed')
-    # Store the XML content as text to allow viewing/downloading
-    xml_content = db.Column(db.Text, nullable=True)
+    # SHA-256 of the uploaded PDF bytes, used as the conversion cache key
+    pdf_sha256 = db.Column(db.String(64), nullable=True, index=True)
+    # XML of conversions made before the shared artifacts existed, only loaded when accessed
+    inline_xml = db.deferred(db.Column('xml_content', db.Text, nullable=True))
     
     # Foreign key to user
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # Converted XML, shared with every other conversion of the same PDF
+    artifact_id = db.Column(db.Integer, db.ForeignKey('xml_artifact.id'), nullable=True)
+    artifact = db.relationship('XmlArtifact', backref='conversions')
+    # Batch upload this conversion was part of, if any
+    batch_id = db.Column(db.String(36), db.ForeignKey('conversion_batch.id'), nullable=True, index=True)
+    # Seconds spent in each stage (upload_read, parse, layout, serialize, ...), see metrics.py
+    stage_timings = db.Column(db.JSON, nullable=True)
+    
+    def open_xml(self):
+        """Open the converted XML as a binary stream without loading it all into memory."""
+        if self.artifact is not None:
+            return self.artifact.open()
+        return BytesIO(self.inline_xml.encode('utf-8'))
     
     def __repr__(self):
         return f'<Conversion {self.pdf_filename} to {self.xml_filename}>'
+
+class XmlArtifact(db.Model):
+    """Converted XML stored once per cache key and referenced by conversions, see conversion_cache.py."""
+    id = db.Column(db.Integer, primary_key=True)
+    # SHA-256 of the PDF hash, converter version and options
+    cache_key = db.Column(db.String(64), unique=True, nullable=True)
+    pdf_sha256 = db.Column(db.String(64), nullable=False)
+    # SHA-256 of the uncompressed XML, also used as its ETag
+    digest = db.Column(db.String(64), nullable=False)
+    # Compressed XML file relative to ARTIFACT_FOLDER, see artifact_store.py
+    storage_path = db.Column(db.String(255), nullable=False)
+    compression = db.Column(db.String(16), nullable=False)
+    size = db.Column(db.Integer, nullable=False)  # Uncompressed size in bytes
+    # {'format': ..., 'pages': [[offset, length, fingerprint], ...]} locating every <page> in the
+    # uncompressed XML, see conversion_cache.previous_fragments
+    page_index = db.deferred(db.Column(db.JSON, nullable=True))
+    hit_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def open(self):
+        """Open the uncompressed XML as a binary stream."""
+        return open_artifact(self.storage_path, self.compression)
+    
+    def __repr__(self):
+        return f'<XmlArtifact {self.cache_key}>'
+
+class ConversionBatch(db.Model):
+    """A group of PDFs uploaded together through the batch form or API, see uploads.py."""
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    file_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    conversions = db.relationship('Conversion', backref='batch', lazy='dynamic')
+    
+    def __repr__(self):
+        return f'<ConversionBatch {self.id}>'
+
+class ConversionJob(db.Model):
+    """A queued background conversion, claimed and processed by the workers in jobs.py."""
+    id = db.Column(db.Integer, primary_key=True)
+    conversion_id = db.Column(db.Integer, db.ForeignKey('conversion.id'), nullable=False, unique=True)
+    # Uploaded PDF waiting on disk until a worker picks the job up
+    pdf_path = db.Column(db.String(512), nullable=False)
+    status = db.Column(db.String(50), default='queued', nullable=False, index=True)
+    worker = db.Column(db.String(128), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    # Times a worker claimed the job, see CONVERSION_MAX_ATTEMPTS
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    conversion = db.relationship('Conversion', backref=db.backref('job', uselist=False))
+
+    def __repr__(self):
+        return f'<ConversionJob {self.id} {self.status}>'
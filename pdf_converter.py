@@ -1,116 +1,561 @@
+import collections
+import itertools
 import logging
-import re
+import math
+import multiprocessing
 import os
-from io import BytesIO
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import base64
+import hashlib
 from datetime import datetime
 
-def convert_pdf_to_xml(pdf_file):
+from lxml import etree
+from pdfminer.converter import PDFPageAggregator
+from pdfminer.layout import LAParams
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import PDFObjRef, PDFStream, resolve1
+from pdfminer.utils import open_filename
+
+import metrics
+import table_detection
+from document_model import build_page
+from xml_serializer import XML_NAMESPACE, XSI_NAMESPACE, DocumentWriter, merge_styles, renumber_page, serialize_page
+
+# Bumped whenever the XML output changes, so cached conversions are not reused across versions
+CONVERTER_VERSION = "2.4"
+
+# Number of worker processes used for parallel conversion (0 or 1 disables it)
+DEFAULT_WORKERS = int(os.environ.get("PDF_CONVERTER_WORKERS", os.cpu_count() or 1))
+
+# Documents shorter than this are converted in-process, the pool overhead is not worth it
+PARALLEL_MIN_PAGES = int(os.environ.get("PDF_CONVERTER_PARALLEL_MIN_PAGES", 20))
+
+class _TimedAggregator(PDFPageAggregator):
+    """PDFPageAggregator that keeps layout analysis time apart from content stream interpretation."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.layout_seconds = 0.0
+
+    def end_page(self, page):
+        start = time.perf_counter()
+        super().end_page(page)
+        self.layout_seconds += time.perf_counter() - start
+
+def iter_page_layouts(pdf_file, page_numbers=None, laparams=None):
+    """
+    Lazily walk the PDF one page at a time and yield (page_number, LTPage) tuples.
+    pdfminer only parses and lays out the page being yielded, so peak memory is bounded
+    by a single page rather than the whole document. page_numbers are 1-based.
+    Time is recorded in the 'parse', 'interpret' and 'layout' stages, see metrics.py.
+    """
+    if page_numbers is None:
+        numbers = itertools.count(1)
+        indexes = None
+    else:
+        # pdfminer yields the selected pages in document order
+        numbers = iter(sorted(page_numbers))
+        indexes = {number - 1 for number in page_numbers}
+
+    # Same pipeline as pdfminer.high_level.extract_pages, unrolled to time each step
+    with open_filename(pdf_file, 'rb') as fp:
+        resource_manager = PDFResourceManager(caching=True)
+        device = _TimedAggregator(resource_manager, laparams=laparams or LAParams())
+        interpreter = PDFPageInterpreter(resource_manager, device)
+        pages = PDFPage.get_pages(fp, indexes)
+        for page_number in numbers:
+            start = time.perf_counter()
+            page = next(pages, None)
+            parsed = time.perf_counter()
+            metrics.add_stage_time('parse', parsed - start)
+            if page is None:
+                return
+
+            device.layout_seconds = 0.0
+            interpreter.process_page(page)
+            layout = device.get_result()
+            metrics.add_stage_time('interpret', time.perf_counter() - parsed - device.layout_seconds)
+            metrics.add_stage_time('layout', device.layout_seconds)
+            yield page_number, layout
+
+def iter_pages(pdf_file, page_numbers=None, laparams=None, detect_tables=True):
+    """
+    Yield (page_number, page) with each page in the compact document model. Every LTPage
+    is released as soon as its Page is built.
+    """
+    for page_number, layout in iter_page_layouts(pdf_file, page_numbers, laparams):
+        tables = None
+        if detect_tables:
+            with metrics.timed('tables'):
+                tables = table_detection.detect_tables(layout)
+        with metrics.timed('model'):
+            page = build_page(page_number, layout, tables)
+        yield page_number, page
+
+def iter_page_fragments(pdf_file, page_numbers=None, laparams=None, pretty=True, detect_tables=True):
+    """Yield (page_number, xml_fragment) with each page serialized to UTF-8 bytes."""
+    for page_number, page in iter_pages(pdf_file, page_numbers, laparams, detect_tables):
+        yield page_number, serialize_page(page, pretty=pretty)
+
+def iter_xml_pages(xml_file, first_page=1):
+    """
+    Incrementally parse converted XML from a binary stream and yield (page_number, page_xml)
+    for every <page> from first_page on. Parsed pages are discarded as soon as they have
+    been yielded, so memory stays bounded by one page.
+    """
+    pages = etree.iterparse(xml_file, events=('end',), tag=f'{{{XML_NAMESPACE}}}page',
+                            load_dtd=False, no_network=True, resolve_entities=False)
+    for _, element in pages:
+        page_number = int(element.get('number'))
+        if page_number >= first_page:
+            yield page_number, etree.tostring(element, encoding='unicode', with_tail=False)
+        # Free the page and any already-processed siblings
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+# Start and end tags of pages in converted XML; text never contains a raw '<'
+PAGE_TAGS = re.compile(rb'<page[ >]|</page>')
+
+def scan_page_offsets(xml_file):
+    """
+    Find the (offset, length) of every <page> in converted XML read from a binary stream,
+    for documents stored before their page index was recorded.
+    """
+    offsets = []
+    start = None
+    position = 0
+    tail = b''
+    for block in iter(lambda: xml_file.read(1024 * 1024), b''):
+        data = tail + block
+        base = position - len(tail)
+        for match in PAGE_TAGS.finditer(data):
+            # Matches that lie entirely in the carried over tail were found in the last block
+            if match.end() <= len(tail):
+                continue
+            if match.group() == b'</page>':
+                offsets.append((start, base + match.end() - start))
+            else:
+                start = base + match.start()
+        position += len(block)
+        tail = data[-6:]
+    return offsets
+
+def read_range(xml_file, start, length):
+    """Read length bytes from start of a binary stream that may not be seekable, e.g. gzip."""
+    remaining = start
+    while remaining > 0:
+        skipped = len(xml_file.read(min(remaining, 1024 * 1024)))
+        if not skipped:
+            return b''
+        remaining -= skipped
+    return xml_file.read(length)
+
+def read_styles(xml_file):
+    """
+    Read the <styles> table of converted XML from a binary stream as {id: style}, style
+    being a tuple of (attribute, value) pairs. Parsing stops at the document content, so
+    the stream may also hold just the head of the document, up to its first page.
+    """
+    styles = {}
+    parser = etree.XMLPullParser(events=('start', 'end'), load_dtd=False, no_network=True,
+                                 resolve_entities=False)
+    for block in iter(lambda: xml_file.read(64 * 1024), b''):
+        parser.feed(block)
+        for event, element in parser.read_events():
+            if event == 'start' and element.tag == f'{{{XML_NAMESPACE}}}document-content':
+                return styles
+            if event == 'end' and element.tag == f'{{{XML_NAMESPACE}}}style':
+                attributes = dict(element.attrib)
+                reference = attributes.pop('id')
+                styles[reference] = tuple(attributes.items())
+    return styles
+
+def parse_page_slice(fragment):
+    """
+    Parse the bytes of one <page> sliced from converted XML by its page index, and return
+    (page_number, page_xml) with the namespaces of the document declared, as iter_xml_pages
+    yields them.
+    """
+    parser = etree.XMLParser(load_dtd=False, no_network=True, resolve_entities=False)
+    wrapper = etree.fromstring(f'<pages xmlns="{XML_NAMESPACE}" xmlns:xsi="{XSI_NAMESPACE}">'.encode()
+                               + fragment + b'</pages>', parser)
+    return int(wrapper[0].get('number')), etree.tostring(wrapper[0], encoding='unicode', with_tail=False)
+
+def _document_metadata(pdf_file):
+    """Collect the <metadata> values without reading the whole upload."""
+    pdf_file.seek(0, os.SEEK_END)
+    file_size = pdf_file.tell()
+    pdf_file.seek(0)
+    # Extract a sample of data as base64 for preview purposes
+    sample = base64.b64encode(pdf_file.read(100)).decode('utf-8')
+    pdf_file.seek(0)
+    return {
+        'creation_date': datetime.now().isoformat(),
+        'file_size': file_size,
+        'content_sample': sample,
+    }
+
+def count_pages(pdf_file):
+    """Count the pages of a PDF by walking its page tree, without laying any of them out."""
+    pdf_file.seek(0)
+    document = PDFDocument(PDFParser(pdf_file))
+    count = sum(1 for _ in PDFPage.create_pages(document))
+    pdf_file.seek(0)
+    return count
+
+def _object_digest(obj, memo, active):
+    """SHA-256 of a PDF object graph; indirect objects are hashed once per document."""
+    if isinstance(obj, PDFObjRef):
+        if obj.objid in memo:
+            return memo[obj.objid]
+        if obj.objid in active:
+            return b'cycle'
+        active.add(obj.objid)
+        value = _object_digest(obj.resolve(), memo, active)
+        active.discard(obj.objid)
+        memo[obj.objid] = value
+        return value
+
+    digest = hashlib.sha256()
+    if isinstance(obj, PDFStream):
+        digest.update(b'stream')
+        digest.update(_object_digest(obj.attrs, memo, active))
+        data = obj.get_rawdata()
+        digest.update(data if data is not None else obj.get_data())
+    elif isinstance(obj, dict):
+        digest.update(b'dict')
+        for key in sorted(obj, key=str):
+            digest.update(str(key).encode('utf-8'))
+            digest.update(_object_digest(obj[key], memo, active))
+    elif isinstance(obj, (list, tuple)):
+        digest.update(b'list')
+        for item in obj:
+            digest.update(_object_digest(item, memo, active))
+    else:
+        digest.update(repr(obj).encode('utf-8'))
+    return digest.digest()
+
+def page_fingerprints(pdf_file):
+    """
+    Fingerprint every page from its decoded content streams, the resources they use (fonts,
+    images, ...) and its boxes. Pages with the same fingerprint convert to the same XML, so
+    the fingerprint finds the pages an earlier conversion can supply.
+    """
+    pdf_file.seek(0)
+    document = PDFDocument(PDFParser(pdf_file))
+    memo = {}
+    fingerprints = []
+    for page in PDFPage.create_pages(document):
+        digest = hashlib.sha256()
+        for stream in page.contents:
+            stream = resolve1(stream)
+            if isinstance(stream, PDFStream):
+                digest.update(stream.get_data())
+        digest.update(_object_digest(page.resources, memo, set()))
+        digest.update(repr((page.mediabox, page.cropbox, page.rotate)).encode('utf-8'))
+        fingerprints.append(digest.hexdigest()[:32])
+    pdf_file.seek(0)
+    return fingerprints
+
+class PageFragments:
+    """
+    The serialized pages of an earlier conversion, looked up by page fingerprint.
+    page_index holds one (offset, length, fingerprint) entry per page, as collected by
+    iter_converted_xml, and opener returns a fresh binary stream of the uncompressed XML.
+    Pages are read by skipping forward through the stream, so reading them in document
+    order only decompresses the earlier XML once.
+    """
+
+    def __init__(self, opener, page_index):
+        self._opener = opener
+        self._pages = {fingerprint: (number, offset, length)
+                       for number, (offset, length, fingerprint) in enumerate(page_index, 1)}
+        self._stream = None
+        self._position = 0
+        self._styles = None
+
+    @property
+    def styles(self):
+        """The <styles> table of the earlier XML, read on first use."""
+        if self._styles is None:
+            stream = self._opener()
+            try:
+                self._styles = read_styles(stream)
+            finally:
+                stream.close()
+        return self._styles
+
+    def __contains__(self, fingerprint):
+        return fingerprint in self._pages
+
+    def read(self, fingerprint):
+        """Return (page_number, fragment) of the page with this fingerprint in the earlier XML."""
+        number, offset, length = self._pages[fingerprint]
+        if self._stream is None or offset < self._position:
+            self.close()
+            self._stream = self._opener()
+            self._position = 0
+        while self._position < offset:
+            skipped = len(self._stream.read(min(offset - self._position, 1024 * 1024)))
+            if not skipped:
+                raise Exception("Earlier XML is shorter than its page index")
+            self._position += skipped
+        fragment = self._stream.read(length)
+        self._position += len(fragment)
+        return number, fragment
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+def split_page_ranges(page_count, workers):
+    """
+    Split 1..page_count into contiguous (first, last) ranges.
+    Several ranges per worker keep the pool busy when some pages are much heavier than others.
+    """
+    chunk_size = max(1, math.ceil(page_count / (workers * 4)))
+    return [(first, min(first + chunk_size - 1, page_count))
+            for first in range(1, page_count + 1, chunk_size)]
+
+def _convert_pages(pdf_path, page_numbers, pretty=True, detect_tables=True, inline_styles=False):
+    """
+    Process pool task: lay out and serialize the given pages of the PDF at pdf_path.
+    Returns the fragments, the styles they reference (None with inline styles) and the
+    stage timings of the worker.
+    """
+    styles = None if inline_styles else {}
+    with metrics.collect_stages() as stages, open(pdf_path, 'rb') as pdf_file:
+        fragments = []
+        for _, page in iter_pages(pdf_file, page_numbers=page_numbers, detect_tables=detect_tables):
+            with metrics.timed('serialize'):
+                fragments.append(serialize_page(page, pretty=pretty, styles=styles))
+    return fragments, styles, stages
+
+# Page ranges submitted to the process pool per worker before the oldest one is collected
+RANGES_IN_FLIGHT_PER_WORKER = 2
+
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+def _get_executor(workers):
+    """
+    Return the shared process pool, (re)creating it when the worker count changes or a
+    worker process died and left it broken.
+    """
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers or _executor._broken:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            # spawn rather than fork: the web process may be running other threads
+            _executor = ProcessPoolExecutor(max_workers=workers,
+                                            mp_context=multiprocessing.get_context('spawn'))
+            _executor_workers = workers
+        return _executor
+
+def _iter_parallel_fragments(pdf_file, workers, page_numbers, pretty, detect_tables, styles):
+    """
+    Lay out runs of page_numbers concurrently in the process pool and yield
+    (page_number, fragment) back in document order. Unless styles is None, it receives
+    the styles the fragments reference.
+    """
+    pdf_path = getattr(pdf_file, 'name', None)
+    spooled = None
+    if not isinstance(pdf_path, (str, os.PathLike)) or not os.path.isfile(pdf_path):
+        # Worker processes open the PDF themselves, so in-memory uploads are spooled to disk
+        spooled = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+        pdf_file.seek(0)
+        for chunk in iter(lambda: pdf_file.read(1024 * 1024), b''):
+            spooled.write(chunk)
+        spooled.close()
+        pdf_path = spooled.name
+
+    try:
+        runs = [page_numbers[first - 1:last] for first, last in split_page_ranges(len(page_numbers), workers)]
+        logging.debug(f"Converting {len(page_numbers)} pages in {len(runs)} ranges on {workers} workers")
+
+        def submit(run):
+            return executor.submit(_convert_pages, pdf_path, run, pretty, detect_tables, styles is None)
+
+        executor = _get_executor(workers)
+        queued = iter(runs)
+        in_flight = collections.deque()
+        retried = False
+        while True:
+            # A few ranges per worker are submitted at a time, so finished fragments waiting for
+            # an earlier range are bounded by the worker count rather than the document size
+            for run in itertools.islice(queued, workers * RANGES_IN_FLIGHT_PER_WORKER - len(in_flight)):
+                in_flight.append((run, submit(run)))
+            if not in_flight:
+                break
+            run, future = in_flight[0]
+            try:
+                fragments, run_styles, stages = future.result()
+            except BrokenProcessPool:
+                # A worker process died (out of memory, a crash on a malformed PDF); the ranges
+                # not yielded yet get one more try on a new pool before the conversion fails
+                if retried:
+                    raise
+                retried = True
+                logging.warning(f"Conversion process pool broke, restarting it for pages {run[0]}-{page_numbers[-1]}")
+                executor = _get_executor(workers)
+                in_flight = collections.deque((run, submit(run)) for run, _ in in_flight)
+                continue
+            in_flight.popleft()
+            del future
+            if styles is not None:
+                merge_styles(styles, run_styles)
+            # Worker time is summed over processes, so it can exceed the wall clock time
+            metrics.add_stage_times(stages)
+            yield from zip(run, fragments)
+    finally:
+        if spooled is not None:
+            os.unlink(spooled.name)
+
+def _iter_document_pages(fresh, fingerprints, previous):
+    """
+    Yield (page_number, page) in document order, page being a model Page or serialized bytes.
+    Pages found in previous are copied from it, the others are taken from fresh.
+    """
+    if previous is None:
+        yield from fresh
+        return
+    for page_number, fingerprint in enumerate(fingerprints, 1):
+        if fingerprint in previous:
+            start = time.perf_counter()
+            old_number, fragment = previous.read(fingerprint)
+            fragment = renumber_page(fragment, old_number, page_number)
+            metrics.add_stage_time('reuse', time.perf_counter() - start)
+            yield page_number, fragment
+        else:
+            yield next(fresh)
+
+class _ChunkSink:
+    """Binary sink that collects writes until they are drained by a generator."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def write_document(pdf_file, sink, workers=None, pretty=True, detect_tables=True, inline_styles=False):
+    """Convert pdf_file and write the XML document incrementally to a binary file-like sink."""
+    for chunk in iter_converted_xml(pdf_file, workers=workers, pretty=pretty, detect_tables=detect_tables,
+                                    inline_styles=inline_styles):
+        sink.write(chunk)
+
+def iter_converted_xml(pdf_file, workers=None, pretty=True, page_index=None, previous=None, detect_tables=True,
+                       inline_styles=False, parallel_min_pages=None):
+    """
+    Yield the converted document as UTF-8 bytes chunks, roughly one per page, whose
+    concatenation is the full XML. pretty=False produces compact XML without indentation,
+    detect_tables=False leaves tables as plain text blocks. Span styles are collected into
+    a <styles> table in the metadata, which holds the output back until the last page
+    (the pages are spooled and then yielded in blocks of BODY_COPY_SIZE bytes);
+    inline_styles=True writes them on every span instead and streams page by page.
+    pdf_file is a binary file object or a path; with a path the PDF is read from disk
+    in small blocks and handed to parallel workers without being copied.
+    Documents with at least parallel_min_pages pages to lay out (defaults to
+    PDF_CONVERTER_PARALLEL_MIN_PAGES) are split into page ranges and converted on `workers`
+    processes (defaults to PDF_CONVERTER_WORKERS, or the number of CPUs).
+
+    page_index, if given, is a list that receives an (offset, length, fingerprint) entry
+    per page of the output. previous is a PageFragments of an earlier conversion with the
+    same converter options: pages whose fingerprint it contains are copied from it and only
+    the other pages are laid out.
+    """
+    if isinstance(pdf_file, (str, os.PathLike)):
+        with open(pdf_file, 'rb') as opened:
+            yield from iter_converted_xml(opened, workers=workers, pretty=pretty, page_index=page_index,
+                                          previous=previous, detect_tables=detect_tables,
+                                          inline_styles=inline_styles, parallel_min_pages=parallel_min_pages)
+        return
+
+    if workers is None:
+        workers = DEFAULT_WORKERS
+    if parallel_min_pages is None:
+        parallel_min_pages = PARALLEL_MIN_PAGES
+    fingerprints = None
+    page_count = None
+    if page_index is not None or previous is not None:
+        with metrics.timed('fingerprint'):
+            fingerprints = page_fingerprints(pdf_file)
+        page_count = len(fingerprints)
+    elif workers > 1:
+        with metrics.timed('parse'):
+            page_count = count_pages(pdf_file)
+
+    if previous is not None:
+        page_numbers = [number for number, fingerprint in enumerate(fingerprints, 1) if fingerprint not in previous]
+        logging.info(f"Reusing {page_count - len(page_numbers)} of {page_count} pages from an earlier conversion")
+    elif page_count is not None:
+        page_numbers = list(range(1, page_count + 1))
+    else:
+        page_numbers = None
+
+    # Styles referenced by pages that arrive already serialized, from workers or previous
+    fragment_styles = None if inline_styles else {}
+    if previous is not None and fragment_styles is not None and len(page_numbers) < page_count:
+        merge_styles(fragment_styles, previous.styles)
+
+    if workers > 1 and page_numbers is not None and len(page_numbers) >= parallel_min_pages:
+        fresh = _iter_parallel_fragments(pdf_file, workers, page_numbers, pretty, detect_tables, fragment_styles)
+    else:
+        fresh = iter_pages(pdf_file, page_numbers=page_numbers, detect_tables=detect_tables)
+
+    sink = _ChunkSink()
+    writer = DocumentWriter(sink, _document_metadata(pdf_file), pretty=pretty, inline_styles=inline_styles)
+    with writer:
+        for page_number, page in _iter_document_pages(fresh, fingerprints, previous):
+            with metrics.timed('serialize'):
+                if isinstance(page, bytes):
+                    offset, length = writer.write_fragment(page, fragment_styles)
+                else:
+                    offset, length = writer.write_page(page)
+            if page_index is not None:
+                page_index.append((offset, length, fingerprints[page_number - 1]))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+        # Pages spooled until the <styles> table was complete are copied out block by block
+        for _ in writer.finish():
+            yield sink.drain()
+    if page_index is not None and writer.body_offset:
+        # Page offsets were counted from the start of the spooled pages
+        page_index[:] = [(offset + writer.body_offset, length, fingerprint)
+                         for offset, length, fingerprint in page_index]
+    yield sink.drain()
+
+def convert_pdf_to_xml(pdf_file, workers=None, pretty=True, detect_tables=True, inline_styles=False):
     """
     PDF to XML converter that preserves document structure and formatting.
     Produces a well-formed XML document with proper indentation and schema references.
     """
     logging.debug("Starting PDF to XML conversion")
-    
+
     try:
-        # Read PDF content as binary
-        pdf_content = pdf_file.read()
-        
-        # For demonstration purposes, create a structured XML with PDF metadata
-        # In a real implementation, this would parse the PDF content
-        file_size = len(pdf_content)
-        creation_time = datetime.now()
-        
-        # Create a properly formatted XML document with standard indentation
-        xml_parts = []
-        
-        # Add XML declaration (required by XML 1.0 specification)
-        xml_parts.append('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>')
-        
-        # Add DOCTYPE and schema reference
-        xml_parts.append('<!DOCTYPE pdf-document SYSTEM "http://www.example.org/pdf-document.dtd">')
-        
-        # Root element with proper namespace declarations and schema references
-        xml_parts.append('<pdf-document xmlns="http://www.example.org/pdf-xml-schema"')
-        xml_parts.append('             xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"')
-        xml_parts.append('             xsi:schemaLocation="http://www.example.org/pdf-xml-schema http://www.example.org/pdf-document.xsd"')
-        xml_parts.append('             version="1.0"')
-        xml_parts.append('             lang="en-US">')
-        
-        # Add enhanced metadata section with standardized attributes
-        xml_parts.append('  <metadata>')
-        xml_parts.append(f'    <creation-date>{creation_time.isoformat()}</creation-date>')
-        xml_parts.append(f'    <file-info>')
-        xml_parts.append(f'      <file-size unit="bytes">{file_size}</file-size>')
-        xml_parts.append('      <file-format>application/pdf</file-format>')
-        xml_parts.append('      <character-encoding>UTF-8</character-encoding>')
-        xml_parts.append('    </file-info>')
-        
-        # Extract a sample of data as base64 for preview purposes
-        sample = base64.b64encode(pdf_content[:100]).decode('utf-8')
-        xml_parts.append(f'    <content-sample encoding="base64">{sample}</content-sample>')
-        xml_parts.append('  </metadata>')
-        
-        # Add document structure with consistent formatting attributes
-        xml_parts.append('  <document-content>')
-        
-        # Header section with standardized attributes
-        xml_parts.append('    <section id="header" type="heading" level="1" role="banner">')
-        xml_parts.append('      <paragraph font-family="Times" font-size="16" font-weight="bold" text-align="center">')
-        xml_parts.append('        This is a PDF document converted to XML format.')
-        xml_parts.append('      </paragraph>')
-        xml_parts.append('      <paragraph font-family="Arial" font-size="12" text-align="justify">')
-        xml_parts.append('        The actual text content with preserved formatting would be extracted here.')
-        xml_parts.append('      </paragraph>')
-        xml_parts.append('    </section>')
-        
-        # Body section with consistent styling attributes
-        xml_parts.append('    <section id="body" type="content" role="main">')
-        xml_parts.append('      <paragraph font-family="Arial" font-size="12" margin-top="10" margin-bottom="10" text-align="justify">')
-        xml_parts.append('        PDF text content is organized into paragraphs with preserved styling.')
-        xml_parts.append('      </paragraph>')
-        xml_parts.append('      <paragraph font-family="Arial" font-size="12" font-style="italic" text-align="justify">')
-        xml_parts.append('        Text formatting like <span font-weight="bold">bold</span> and <span font-style="italic">italic</span> is preserved.')
-        xml_parts.append('      </paragraph>')
-        
-        # Table with proper header structure
-        xml_parts.append('      <table id="sample-table" rows="2" columns="2" border="1" cellpadding="5">')
-        xml_parts.append('        <thead>')
-        xml_parts.append('          <tr role="row">')
-        xml_parts.append('            <th role="columnheader" scope="col">Header 1</th>')
-        xml_parts.append('            <th role="columnheader" scope="col">Header 2</th>')
-        xml_parts.append('          </tr>')
-        xml_parts.append('        </thead>')
-        xml_parts.append('        <tbody>')
-        xml_parts.append('          <tr role="row">')
-        xml_parts.append('            <td role="cell">Sample</td>')
-        xml_parts.append('            <td role="cell">Table</td>')
-        xml_parts.append('          </tr>')
-        xml_parts.append('          <tr role="row">')
-        xml_parts.append('            <td role="cell">Data</td>')
-        xml_parts.append('            <td role="cell">Content</td>')
-        xml_parts.append('          </tr>')
-        xml_parts.append('        </tbody>')
-        xml_parts.append('      </table>')
-        xml_parts.append('    </section>')
-        
-        # Footer section with standardized attributes
-        xml_parts.append('    <section id="footer" type="footer" role="contentinfo">')
-        xml_parts.append('      <paragraph font-family="Arial" font-size="10" text-align="center">')
-        xml_parts.append('        PDF document metadata and additional information is preserved here.')
-        xml_parts.append('      </paragraph>')
-        xml_parts.append('      <paragraph font-family="Arial" font-size="8" text-align="right">')
-        xml_parts.append(f'        Generated on: {creation_time.strftime("%Y-%m-%d %H:%M:%S")}')
-        xml_parts.append('      </paragraph>')
-        xml_parts.append('    </section>')
-        
-        xml_parts.append('  </document-content>')
-        xml_parts.append('</pdf-document>')
-        
-        # Join all XML parts and return with proper line endings for readability
-        xml_content = '\n'.join(xml_parts)
-        return xml_content
-        
+        xml_content = b''.join(iter_converted_xml(pdf_file, workers=workers, pretty=pretty,
+                                                   detect_tables=detect_tables, inline_styles=inline_styles))
+        return xml_content.decode('utf-8')
+
     except Exception as e:
         logging.error(f"Error creating XML structure: {str(e)}")
-        raise Exception(f"Failed to create XML structure: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Failed to create XML structure: {str(e)}")
@@ -1,31 +1,88 @@
 import os
-import uuid
+import time
+import zlib
 from datetime import datetime
-from flask import render_template, redirect, url_for, flash, request, jsonify, send_file, session
+from io import BytesIO
+from flask import Blueprint, current_app, render_template, redirect, url_for, flash, request, jsonify, send_file, session, Response, abort, g
 from flask_login import login_user, logout_user, current_user, login_required
 from werkzeug.utils import secure_filename
-from io import BytesIO
+from sqlalchemy import and_, or_
+
+from app import db
+from models import User, Conversion, ConversionBatch
+from forms import RegistrationForm, LoginForm, PDFUploadForm, BatchUploadForm
+from jobs import notify_workers, start_workers
+from uploads import UploadError, create_batch, create_conversion, save_upload
+import artifact_store
+from db_routing import read_replica
+import metrics
+
+# Size of the chunks streamed to clients downloading XML
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Upper bound on the number of pages returned by one page API request
+MAX_PAGES_PER_REQUEST = 100
+
+# Pages per XML slice when the client does not ask for a count, and the largest byte slice served
+XML_SLICE_PAGES = 5
+MAX_XML_SLICE_BYTES = 1024 * 1024
+
+# Number of conversions listed per history page by default, and the most a client may ask for
+HISTORY_PAGE_SIZE = 25
+MAX_HISTORY_PAGE_SIZE = 200
 
-from app import app, db
-from models import User, Conversion
-from forms import RegistrationForm, LoginForm, PDFUploadForm
-from pdf_converter import convert_pdf_to_xml
+bp = Blueprint('main', __name__)
 
-@app.route('/')
+REQUEST_SECONDS = metrics.Histogram('http_request_duration_seconds',
+                                    'Time to handle a request, up to the first byte of streamed bodies',
+                                    ['endpoint', 'method'])
+REQUESTS = metrics.Counter('http_requests_total', 'Handled requests', ['endpoint', 'method', 'status'])
+
+@bp.before_app_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@bp.after_app_request
+def record_request_metrics(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, method=request.method)
+        REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+@bp.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint, only answered for clients in METRICS_ALLOWED_IPS."""
+    if request.remote_addr not in current_app.config['METRICS_ALLOWED_IPS']:
+        abort(404)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@bp.app_errorhandler(413)
+def upload_too_large(e):
+    """Uploads above MAX_CONTENT_LENGTH are rejected before they are spooled any further."""
+    max_mb = current_app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    message = f'Upload too large. The maximum size is {max_mb}MB.'
+    if request.path.startswith('/api/'):
+        return jsonify({'error': message}), 413
+    flash(message, 'error')
+    return redirect(url_for('main.dashboard'))
+
+@bp.route('/')
 def index():
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     return render_template('index.html')
     
-@app.route('/pdf-download')
+@bp.route('/pdf-download')
 def pdf_download_page():
     """Route to display a simple download page for the source code PDF."""
-    return app.send_static_file('download_pdf.html')
+    return current_app.send_static_file('download_pdf.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     form = RegistrationForm()
     if form.validate_on_submit():
@@ -34,14 +91,14 @@ def register():
         db.session.add(user)
         db.session.commit()
         flash('Your account has been created! You can now log in.', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
     return render_template('register.html', form=form)
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     form = LoginForm()
     if form.validate_on_submit():
@@ -50,86 +107,257 @@ def login():
             login_user(user, remember=form.remember.data)
             next_page = request.args.get('next')
             flash('Login successful!', 'success')
-            return redirect(next_page or url_for('dashboard'))
+            return redirect(next_page or url_for('main.dashboard'))
         else:
             flash('Login unsuccessful. Please check email and password.', 'error')
     
     return render_template('login.html', form=form)
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     logout_user()
     flash('You have been logged out.', 'info')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/dashboard', methods=['GET', 'POST'])
+@bp.route('/dashboard', methods=['GET', 'POST'])
 @login_required
 def dashboard():
     form = PDFUploadForm()
+    batch_form = BatchUploadForm()
     if form.validate_on_submit():
         # Process the PDF file
         pdf_file = form.pdf_file.data
         original_filename = secure_filename(pdf_file.filename)
         
-        # Generate unique filenames for both PDF and XML
-        unique_id = str(uuid.uuid4())
-        pdf_filename = f"{unique_id}_{original_filename}"
-        xml_filename = f"{pdf_filename.rsplit('.', 1)[0]}.xml"
-        
-        # Convert PDF to XML
+        # Save the upload and queue it for the background conversion workers
         try:
-            pdf_content = pdf_file.read()
-            file_size = len(pdf_content)
-            xml_content = convert_pdf_to_xml(BytesIO(pdf_content))
-            
-            # Store conversion record in database
-            conversion = Conversion(
-                pdf_filename=original_filename,
-                xml_filename=xml_filename,
-                file_size=file_size,
-                xml_content=xml_content,
-                user_id=current_user.id
-            )
-            db.session.add(conversion)
+            with metrics.collect_stages() as stages:
+                metrics.add_stage_time('upload_read', request.upload_seconds)
+                with metrics.timed('upload_save'):
+                    pdf_path, xml_filename, pdf_sha256 = save_upload(pdf_file.stream, original_filename)
+            conversion = create_conversion(pdf_path, original_filename, xml_filename, current_user.id,
+                                           pdf_sha256=pdf_sha256, stage_timings=stages)
             db.session.commit()
+            _invalidate_conversion_count(current_user.id)
             
-            # Store the XML content in session for preview
+            # Store the conversion id in session for preview
             session['current_conversion_id'] = conversion.id
             
-            flash('PDF successfully converted to XML!', 'success')
-            return redirect(url_for('dashboard'))
+            if conversion.status == 'completed':
+                flash('PDF successfully converted to XML!', 'success')
+            else:
+                start_workers(current_app._get_current_object())
+                notify_workers()
+                flash('PDF uploaded and queued for conversion.', 'success')
+            return redirect(url_for('main.dashboard'))
             
         except Exception as e:
+            db.session.rollback()
             flash(f'Error converting PDF: {str(e)}', 'error')
-            app.logger.error(f"PDF conversion error: {str(e)}")
+            current_app.logger.error(f"PDF conversion error: {str(e)}")
             
     # Get the most recent conversion for preview if available
     current_conversion = None
     if 'current_conversion_id' in session:
         current_conversion = Conversion.query.get(session['current_conversion_id'])
         
-    return render_template('dashboard.html', form=form, conversion=current_conversion)
+    return render_template('dashboard.html', form=form, batch_form=batch_form, conversion=current_conversion)
+
+@bp.route('/batch', methods=['POST'])
+@login_required
+def batch_upload():
+    form = BatchUploadForm()
+    if not form.validate_on_submit():
+        for error in form.pdf_files.errors:
+            flash(error, 'error')
+        return redirect(url_for('main.dashboard'))
+    
+    try:
+        batch = create_batch(form.pdf_files.data, current_user.id)
+    except UploadError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('main.dashboard'))
+    except Exception as e:
+        flash(f'Error uploading batch: {str(e)}', 'error')
+        current_app.logger.error(f"Batch upload error: {str(e)}")
+        return redirect(url_for('main.dashboard'))
+    
+    _invalidate_conversion_count(current_user.id)
+    start_workers(current_app._get_current_object())
+    notify_workers()
+    flash(f'{batch.file_count} PDF files queued for conversion.', 'success')
+    return redirect(url_for('main.batch_status', batch_id=batch.id))
+
+@bp.route('/batch/<batch_id>')
+@login_required
+def batch_status(batch_id):
+    batch = ConversionBatch.query.get_or_404(batch_id)
+    
+    # Check that this batch belongs to the current user
+    if batch.user_id != current_user.id:
+        flash('You do not have permission to view this batch.', 'error')
+        return redirect(url_for('main.history'))
+    
+    return render_template('batch.html', batch=batch, progress=_batch_progress(batch))
 
-@app.route('/history')
+@bp.route('/api/batch', methods=['POST'])
 @login_required
+def create_batch_api():
+    """Upload many PDFs (or ZIP archives of PDFs) as the 'files' field and queue them as one batch."""
+    files = request.files.getlist('files')
+    if not files:
+        return jsonify({'error': "No files uploaded in the 'files' field"}), 400
+    
+    try:
+        batch = create_batch(files, current_user.id)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    _invalidate_conversion_count(current_user.id)
+    start_workers(current_app._get_current_object())
+    notify_workers()
+    response = jsonify(_batch_progress(batch))
+    response.status_code = 202
+    response.headers['Location'] = url_for('main.get_batch_api', batch_id=batch.id)
+    return response
+
+@bp.route('/api/batch/<batch_id>')
+@login_required
+@read_replica
+def get_batch_api(batch_id):
+    batch = ConversionBatch.query.get_or_404(batch_id)
+    
+    # Check that this batch belongs to the current user
+    if batch.user_id != current_user.id:
+        return jsonify({'error': 'Not authorized'}), 403
+    
+    return jsonify(_batch_progress(batch))
+
+def _batch_progress(batch):
+    """Summarize a batch: counts per status plus the status of every file."""
+    conversions = (batch.conversions
+                   .options(db.joinedload(Conversion.job))
+                   .order_by(Conversion.id)
+                   .all())
+    counts = {}
+    for conversion in conversions:
+        counts[conversion.status] = counts.get(conversion.status, 0) + 1
+    finished = counts.get('completed', 0) + counts.get('failed', 0)
+    
+    return {
+        'batch_id': batch.id,
+        'created_at': batch.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'file_count': batch.file_count,
+        'counts': counts,
+        'finished': finished == len(conversions),
+        'progress': round(100 * finished / len(conversions)) if conversions else 100,
+        'files': [{
+            'id': conversion.id,
+            'pdf_filename': conversion.pdf_filename,
+            'status': conversion.status,
+            'error': conversion.job.error if conversion.job else None,
+            'download_url': url_for('main.download_xml', conversion_id=conversion.id)
+        } for conversion in conversions]
+    }
+
+@bp.route('/history')
+@login_required
+@read_replica
 def history():
-    conversions = Conversion.query.filter_by(user_id=current_user.id).order_by(Conversion.conversion_date.desc()).all()
-    return render_template('history.html', conversions=conversions)
+    """
+    List the user's conversions newest first with keyset pagination on
+    (conversion_date, id), so each page costs O(page size) however long the history is.
+    """
+    per_page = min(max(request.args.get('per_page', HISTORY_PAGE_SIZE, type=int), 1), MAX_HISTORY_PAGE_SIZE)
+    before = _parse_history_cursor(request.args.get('before'))
+    after = _parse_history_cursor(request.args.get('after'))
+    
+    query = Conversion.query.filter_by(user_id=current_user.id)
+    if after is not None:
+        # Walking back towards newer rows: read ascending, then flip
+        query = query.filter(or_(
+            Conversion.conversion_date > after[0],
+            and_(Conversion.conversion_date == after[0], Conversion.id > after[1])
+        )).order_by(Conversion.conversion_date.asc(), Conversion.id.asc())
+    else:
+        if before is not None:
+            query = query.filter(or_(
+                Conversion.conversion_date < before[0],
+                and_(Conversion.conversion_date == before[0], Conversion.id < before[1])
+            ))
+        query = query.order_by(Conversion.conversion_date.desc(), Conversion.id.desc())
+    
+    # Fetch one extra row to know whether another page exists in that direction
+    conversions = query.limit(per_page + 1).all()
+    has_more = len(conversions) > per_page
+    conversions = conversions[:per_page]
+    if after is not None:
+        conversions.reverse()
+        has_newer, has_older = has_more, True
+    else:
+        has_newer, has_older = before is not None, has_more
+    
+    newer_url = older_url = None
+    if conversions and has_newer:
+        newer_url = url_for('main.history', after=_history_cursor(conversions[0]), per_page=per_page)
+    if conversions and has_older:
+        older_url = url_for('main.history', before=_history_cursor(conversions[-1]), per_page=per_page)
+    
+    return render_template(
+        'history.html',
+        conversions=conversions,
+        total_count=_conversion_count(current_user.id),
+        newer_url=newer_url,
+        older_url=older_url
+    )
+
+def _history_cursor(conversion):
+    return f"{conversion.conversion_date.isoformat()}_{conversion.id}"
+
+def _parse_history_cursor(value):
+    """Decode a (conversion_date, id) cursor, ignoring malformed values."""
+    if not value:
+        return None
+    try:
+        date, conversion_id = value.rsplit('_', 1)
+        return datetime.fromisoformat(date), int(conversion_id)
+    except ValueError:
+        return None
+
+# Per-process cache of {user_id: (expires_at, count)} for the history total
+_conversion_counts = {}
+
+def _conversion_count(user_id):
+    """Number of conversions of a user, cached for HISTORY_COUNT_CACHE_TTL seconds (0 disables)."""
+    ttl = current_app.config['HISTORY_COUNT_CACHE_TTL']
+    now = time.monotonic()
+    cached = _conversion_counts.get(user_id)
+    if ttl > 0 and cached is not None and cached[0] > now:
+        return cached[1]
+    
+    count = db.session.query(db.func.count(Conversion.id)).filter_by(user_id=user_id).scalar()
+    if ttl > 0:
+        _conversion_counts[user_id] = (now + ttl, count)
+    return count
+
+def _invalidate_conversion_count(user_id):
+    _conversion_counts.pop(user_id, None)
 
-@app.route('/conversion/<int:conversion_id>')
+@bp.route('/conversion/<int:conversion_id>')
 @login_required
+@read_replica
 def view_conversion(conversion_id):
     conversion = Conversion.query.get_or_404(conversion_id)
     
     # Check that this conversion belongs to the current user
     if conversion.user_id != current_user.id:
         flash('You do not have permission to view this conversion.', 'error')
-        return redirect(url_for('history'))
+        return redirect(url_for('main.history'))
     
     session['current_conversion_id'] = conversion.id
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
 
-@app.route('/download/<int:conversion_id>')
+@bp.route('/download/<int:conversion_id>')
 @login_required
 def download_xml(conversion_id):
     conversion = Conversion.query.get_or_404(conversion_id)
@@ -137,23 +365,72 @@ def download_xml(conversion_id):
     # Check that this conversion belongs to the current user
     if conversion.user_id != current_user.id:
         flash('You do not have permission to download this file.', 'error')
-        return redirect(url_for('history'))
+        return redirect(url_for('main.history'))
     
-    # Create BytesIO object with the XML content
-    xml_data = BytesIO(conversion.xml_content.encode('utf-8'))
+    if conversion.status != 'completed' or (conversion.artifact is None and conversion.inline_xml is None):
+        flash('This conversion has not completed yet.', 'info')
+        return redirect(url_for('main.history'))
     
     # Generate a filename based on the original PDF name
     filename = f"{conversion.pdf_filename.rsplit('.', 1)[0]}.xml"
     
-    return send_file(
-        xml_data,
-        mimetype='application/xml',
-        as_attachment=True,
-        download_name=filename
-    )
+    artifact = conversion.artifact
+    if artifact is not None:
+        if artifact.compression in request.accept_encodings:
+            # Hand the compressed file straight to the client, with conditional and range support
+            response = send_file(
+                artifact_store.full_path(artifact.storage_path),
+                mimetype='application/xml',
+                as_attachment=True,
+                download_name=filename,
+                conditional=True,
+                etag=f"{artifact.digest}-{artifact.compression}"
+            )
+            response.headers['Content-Encoding'] = artifact.compression
+            response.vary.add('Accept-Encoding')
+            return response
+    
+    # Otherwise stream the XML in chunks, gzip-compressing on the fly when the client accepts it
+    encoding = 'gzip' if 'gzip' in request.accept_encodings else None
+    etag = None
+    if artifact is not None:
+        etag = f"{artifact.digest}-{encoding}" if encoding else artifact.digest
+    
+    if etag and request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(
+            _stream_xml(conversion.open_xml(), compress=encoding == 'gzip'),
+            mimetype='application/xml'
+        )
+        response.headers.set('Content-Disposition', 'attachment', filename=filename)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        elif artifact is not None:
+            response.content_length = artifact.size
+    if etag:
+        response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    return response
 
-@app.route('/api/conversion/<int:conversion_id>')
+def _stream_xml(xml_file, compress=False):
+    """Yield an XML stream in STREAM_CHUNK_SIZE pieces, optionally as a gzip stream."""
+    # wbits=31 makes zlib write a gzip header and trailer
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    try:
+        for chunk in iter(lambda: xml_file.read(STREAM_CHUNK_SIZE), b''):
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+        if compressor is not None:
+            yield compressor.flush()
+    finally:
+        xml_file.close()
+
+@bp.route('/api/conversion/<int:conversion_id>')
 @login_required
+@read_replica
 def get_conversion_data(conversion_id):
     conversion = Conversion.query.get_or_404(conversion_id)
     
@@ -161,30 +438,209 @@ def get_conversion_data(conversion_id):
     if conversion.user_id != current_user.id:
         return jsonify({'error': 'Not authorized'}), 403
     
+    # The XML itself is served page by page or as a download, never embedded here
     return jsonify({
         'id': conversion.id,
         'pdf_filename': conversion.pdf_filename,
         'xml_filename': conversion.xml_filename,
         'conversion_date': conversion.conversion_date.strftime('%Y-%m-%d %H:%M:%S'),
         'file_size': conversion.file_size,
-        'xml_content': conversion.xml_content
+        'status': conversion.status,
+        'error': conversion.job.error if conversion.job else None,
+        'stage_timings': conversion.stage_timings or {},
+        'pages_url': url_for('main.get_conversion_pages', conversion_id=conversion.id),
+        'xml_url': url_for('main.get_conversion_xml', conversion_id=conversion.id),
+        'download_url': url_for('main.download_xml', conversion_id=conversion.id)
     })
 
-@app.route('/download/source-code')
+@bp.route('/api/conversion/<int:conversion_id>/pages')
+@login_required
+@read_replica
+def get_conversion_pages(conversion_id):
+    """Return the XML of a conversion one batch of <page> elements at a time."""
+    conversion = Conversion.query.get_or_404(conversion_id)
+    
+    # Check that this conversion belongs to the current user
+    if conversion.user_id != current_user.id:
+        return jsonify({'error': 'Not authorized'}), 403
+    
+    if conversion.status != 'completed' or (conversion.artifact is None and conversion.inline_xml is None):
+        return jsonify({'error': 'Conversion has not completed', 'status': conversion.status}), 409
+    
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 10, type=int), 1), MAX_PAGES_PER_REQUEST)
+    
+    artifact = conversion.artifact
+    etag = f"{artifact.digest}-p{page}-{per_page}" if artifact is not None else None
+    if etag and request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    
+    # Loaded on first use, the converter stack is slow to import and most requests never need it
+    from pdf_converter import iter_xml_pages, parse_page_slice, read_range, read_styles
+    
+    pages = []
+    has_more = False
+    if artifact is not None and artifact.page_index:
+        # Read the head for the <styles> table, then only the requested pages, located by the index
+        page_offsets = [(offset, length) for offset, length, _ in artifact.page_index['pages']]
+        batch = page_offsets[page - 1:page - 1 + per_page]
+        head_size = page_offsets[0][0] if page_offsets else artifact.size
+        with conversion.open_xml() as xml_file:
+            styles = read_styles(BytesIO(read_range(xml_file, 0, head_size)))
+            if batch:
+                start = batch[0][0]
+                data = read_range(xml_file, start - head_size, sum(batch[-1]) - start)
+                for offset, length in batch:
+                    page_number, xml = parse_page_slice(data[offset - start:offset - start + length])
+                    pages.append({'number': page_number, 'xml': xml})
+        has_more = page - 1 + per_page < len(page_offsets)
+    else:
+        # Spans reference the <styles> table in the metadata unless the styles were written inline
+        with conversion.open_xml() as xml_file:
+            styles = read_styles(xml_file)
+        
+        # Read one page past the batch to know whether there are more
+        with conversion.open_xml() as xml_file:
+            for page_number, xml in iter_xml_pages(xml_file, first_page=page):
+                if len(pages) == per_page:
+                    has_more = True
+                    break
+                pages.append({'number': page_number, 'xml': xml})
+    
+    response = jsonify({
+        'id': conversion.id,
+        'page': page,
+        'per_page': per_page,
+        'pages': pages,
+        'styles': {reference: dict(style) for reference, style in styles.items()},
+        'has_more': has_more,
+        'next_page': page + per_page if has_more else None
+    })
+    if etag:
+        response.set_etag(etag)
+    return response
+
+def _page_offsets(conversion):
+    """(offset, length) of every <page> in the conversion's XML, from the index recorded at conversion time."""
+    artifact = conversion.artifact
+    if artifact is not None and artifact.page_index:
+        return [(offset, length) for offset, length, _ in artifact.page_index['pages']]
+    # Conversions stored before the index existed are scanned instead
+    from pdf_converter import scan_page_offsets
+    with conversion.open_xml() as xml_file:
+        return scan_page_offsets(xml_file)
+
+def _xml_size(conversion):
+    if conversion.artifact is not None:
+        return conversion.artifact.size
+    return len(conversion.inline_xml.encode('utf-8'))
+
+def _utf8_slice(data, start, end):
+    """
+    Trim data, read from byte start with a few bytes past end, to whole UTF-8 characters:
+    continuation bytes at the front are dropped and a character cut at end is completed.
+    Returns the text and its actual start and end offsets.
+    """
+    lead = 0
+    while lead < min(3, len(data)) and 0x80 <= data[lead] < 0xC0:
+        lead += 1
+    stop = end - start
+    while stop < len(data) and 0x80 <= data[stop] < 0xC0:
+        stop += 1
+    stop = max(stop, lead)
+    return data[lead:stop].decode('utf-8'), start + lead, start + stop
+
+@bp.route('/api/conversion/<int:conversion_id>/xml')
+@login_required
+@read_replica
+def get_conversion_xml(conversion_id):
+    """
+    Return a slice of the converted XML, either `count` pages from `page` or the bytes from
+    `start` to `end`, located with the page offset index. Consecutive page slices join up to
+    the whole document: the first starts with the declaration and metadata, the last ends
+    with the closing tags.
+    """
+    conversion = Conversion.query.get_or_404(conversion_id)
+    
+    # Check that this conversion belongs to the current user
+    if conversion.user_id != current_user.id:
+        return jsonify({'error': 'Not authorized'}), 403
+    
+    if conversion.status != 'completed' or (conversion.artifact is None and conversion.inline_xml is None):
+        return jsonify({'error': 'Conversion has not completed', 'status': conversion.status}), 409
+    
+    size = _xml_size(conversion)
+    page_offsets = _page_offsets(conversion)
+    page_count = len(page_offsets)
+    first_page = last_page = next_page = None
+    if 'start' in request.args or 'end' in request.args:
+        start = min(max(request.args.get('start', 0, type=int), 0), size)
+        end = request.args.get('end', start + MAX_XML_SLICE_BYTES, type=int)
+        end = min(max(end, start), size, start + MAX_XML_SLICE_BYTES)
+    elif page_count == 0:
+        start, end = 0, min(size, MAX_XML_SLICE_BYTES)
+    else:
+        first_page = max(request.args.get('page', 1, type=int), 1)
+        count = min(max(request.args.get('count', XML_SLICE_PAGES, type=int), 1), MAX_PAGES_PER_REQUEST)
+        if first_page > page_count:
+            return jsonify({'error': f'The document has {page_count} pages'}), 404
+        last_page = min(first_page + count - 1, page_count)
+        # Slices run from the end of the previous page, so the whitespace between pages is kept
+        start = 0 if first_page == 1 else sum(page_offsets[first_page - 2])
+        end = size if last_page == page_count else sum(page_offsets[last_page - 1])
+        next_page = last_page + 1 if last_page < page_count else None
+    
+    artifact = conversion.artifact
+    etag = f"{artifact.digest}-b{start}-{end}" if artifact is not None else None
+    if etag and request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    
+    from pdf_converter import read_range
+    with conversion.open_xml() as xml_file:
+        # Up to three more bytes complete a character cut by a byte range
+        data = read_range(xml_file, start, min(end + 3, size) - start)
+    xml, start, end = _utf8_slice(data, start, end)
+    
+    response = jsonify({
+        'id': conversion.id,
+        'start': start,
+        'end': end,
+        'size': size,
+        'page_count': page_count,
+        'first_page': first_page,
+        'last_page': last_page,
+        'next_page': next_page,
+        'xml': xml
+    })
+    if etag:
+        response.set_etag(etag)
+    return response
+
+@bp.route('/download/source-code')
 def download_source_code():
-    """Route to download the complete source code PDF."""
+    """Download the source code PDF, rebuilt from its cached per-file parts when a source file changed."""
+    # Loaded on first use, like the converter
+    from generate_code_pdf import build_code_pdf
+    
+    folder = current_app.config['SOURCE_PDF_FOLDER']
+    pdf_path = os.path.join(folder, 'source_code.pdf')
     try:
-        pdf_path = "pdf_to_xml_converter_code.pdf"
-        if os.path.exists(pdf_path):
-            return send_file(
-                pdf_path,
-                mimetype='application/pdf',
-                as_attachment=True,
-                download_name="pdf_to_xml_converter_source_code.pdf"
-            )
-        else:
-            flash('Source code PDF not found. Please generate it first.', 'error')
-            return redirect(url_for('index'))
+        # Only a single process renders here, the parts are small enough that starting workers costs more
+        digest = build_code_pdf(pdf_path, os.path.join(folder, 'parts'), root=current_app.root_path, workers=1)
     except Exception as e:
-        flash(f'Error downloading source code: {str(e)}', 'error')
-        return redirect(url_for('index'))
+        current_app.logger.error(f"Source code PDF error: {str(e)}")
+        flash(f'Error generating the source code PDF: {str(e)}', 'error')
+        return redirect(url_for('main.index'))
+    
+    return send_file(
+        pdf_path,
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name="pdf_to_xml_converter_source_code.pdf",
+        conditional=True,
+        etag=digest
+    )
@@ -105,7 +105,10 @@ document.addEventListener('DOMContentLoaded', function() {
         copyXmlBtn.addEventListener('click', function() {
             const xmlContent = document.getElementById('xmlContent');
             if (xmlContent) {
-                navigator.clipboard.writeText(xmlContent.textContent)
+                // The viewer only holds the pages scrolled to so far, copy the whole document
+                fetch(xmlContent.dataset.downloadUrl)
+                    .then(response => response.text())
+                    .then(text => navigator.clipboard.writeText(text))
                     .then(() => {
                         // Change button text temporarily
                         const originalText = copyXmlBtn.textContent;
@@ -122,6 +125,53 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    // Poll a queued or running conversion and refresh once it has finished
+    const conversionStatus = document.getElementById('conversionStatus');
+    if (conversionStatus && ['queued', 'running'].includes(conversionStatus.dataset.status)) {
+        const conversionId = conversionStatus.dataset.conversionId;
+        const pollStatus = function() {
+            fetch(`/api/conversion/${conversionId}`)
+                .then(response => response.json())
+                .then(data => {
+                    if (data.status === 'completed' || data.status === 'failed') {
+                        window.location.reload();
+                    } else {
+                        setTimeout(pollStatus, 2000);
+                    }
+                })
+                .catch(err => {
+                    console.error('Failed to poll conversion status: ', err);
+                    setTimeout(pollStatus, 5000);
+                });
+        };
+        setTimeout(pollStatus, 2000);
+    }
+    
+    // Refresh a batch page until every file in it has finished converting
+    const batchProgress = document.getElementById('batchProgress');
+    if (batchProgress && batchProgress.dataset.finished !== 'true') {
+        const batchId = batchProgress.dataset.batchId;
+        const pollBatch = function() {
+            fetch(`/api/batch/${batchId}`)
+                .then(response => response.json())
+                .then(data => {
+                    if (data.finished) {
+                        window.location.reload();
+                    } else {
+                        const bar = batchProgress.querySelector('.progress-bar');
+                        bar.style.width = `${data.progress}%`;
+                        bar.textContent = `${data.progress}%`;
+                        setTimeout(pollBatch, 3000);
+                    }
+                })
+                .catch(err => {
+                    console.error('Failed to poll batch status: ', err);
+                    setTimeout(pollBatch, 5000);
+                });
+        };
+        setTimeout(pollBatch, 3000);
+    }
+    
     // Auto-hide alerts after 5 seconds
     const alerts = document.querySelectorAll('.alert');
     if (alerts.length > 0) {
@@ -0,0 +1,54 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const xmlViewer = document.getElementById('xmlContent');
+
+    if (xmlViewer && xmlViewer.dataset.sliceUrl) {
+        // Fetch the converted XML a few pages at a time as the viewer is scrolled,
+        // so the dashboard stays small however large the document is
+        const sliceUrl = xmlViewer.dataset.sliceUrl;
+        // Load the next slice when the end of the text is less than this many pixels away
+        const scrollMargin = 400;
+        let nextPage = 1;
+        let loading = false;
+
+        function loadSlice() {
+            if (loading || nextPage === null) {
+                return;
+            }
+            loading = true;
+
+            fetch(`${sliceUrl}?page=${nextPage}`)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`HTTP ${response.status}`);
+                    }
+                    return response.json();
+                })
+                .then(slice => {
+                    xmlViewer.appendChild(document.createTextNode(slice.xml));
+                    nextPage = slice.next_page;
+                    loading = false;
+                    // Keep loading until the viewer can scroll
+                    if (xmlViewer.scrollHeight <= xmlViewer.clientHeight + scrollMargin) {
+                        loadSlice();
+                    }
+                })
+                .catch(error => {
+                    console.error('Error loading XML:', error);
+                    const message = document.createElement('div');
+                    message.className = 'text-danger';
+                    message.textContent = `Error loading XML: ${error.message}`;
+                    xmlViewer.appendChild(message);
+                    nextPage = null;
+                    loading = false;
+                });
+        }
+
+        xmlViewer.addEventListener('scroll', function() {
+            if (xmlViewer.scrollTop + xmlViewer.clientHeight >= xmlViewer.scrollHeight - scrollMargin) {
+                loadSlice();
+            }
+        });
+
+        loadSlice();
+    }
+});
@@ -0,0 +1,249 @@
+"""
+Table detection over the glyphs of a laid out page.
+
+Character boxes and ruling lines are copied into NumPy arrays once per page. Text rows are
+found by splitting the sorted glyph centres at vertical gaps, and the horizontal occupancy
+of every row is built as one (rows x points) matrix. Runs of consecutive rows that each
+contain wide whitespace gaps are table candidates; their columns are the gaps shared by all
+of those rows, and horizontal rules (when the table is ruled) merge wrapped text rows into
+one table row. Only the final string building loops in Python.
+"""
+import re
+from collections import namedtuple
+
+import numpy as np
+from pdfminer.layout import LTChar, LTCurve, LTTextContainer, LTTextLine
+
+# Narrowest whitespace, in points, that separates two table columns
+MIN_COLUMN_GAP = 8.0
+MIN_TABLE_ROWS = 3
+MIN_TABLE_COLUMNS = 2
+# Without rules two columns are more likely a two-column text layout than a table
+MIN_UNRULED_COLUMNS = 3
+# Glyph centres closer than this fraction of the median glyph height belong to one row
+ROW_TOLERANCE = 0.5
+# Rows further apart than this many glyph heights end a table
+MAX_ROW_SPACING = 3.0
+# Ruling lines thinner than this are treated as lines rather than filled areas
+MAX_RULE_WIDTH = 2.0
+
+NUMERIC_CELL = re.compile(r'^[-+(]?[$€£]?\s*[\d.,]+%?\)?$')
+
+DetectedTable = namedtuple('DetectedTable', ['bbox', 'rows', 'header', 'ruled', 'elements'])
+# Per-glyph arrays of a page, and per-text-row arrays including the row occupancy matrix
+_Glyphs = namedtuple('_Glyphs', ['x0', 'x1', 'centres', 'heights', 'element_index', 'bold', 'texts', 'row_of'])
+_Rows = namedtuple('_Rows', ['top', 'bottom', 'left', 'right', 'occupied'])
+
+DetectedTable.__doc__ = """
+A table found on a page: bbox (x0, y0, x1, y1), rows as lists of cell strings, whether the
+first row is a header, whether it is ruled, and the indexes of the page's layout elements
+whose text it replaces.
+"""
+
+def _collect_glyphs(layout):
+    """Copy the characters of the page's text containers into parallel lists."""
+    x0, y0, x1, y1, element_index, bold, texts = [], [], [], [], [], [], []
+    for index, element in enumerate(layout):
+        if not isinstance(element, LTTextContainer):
+            continue
+        lines = [element] if isinstance(element, LTTextLine) else element
+        for line in lines:
+            if not isinstance(line, LTTextLine):
+                continue
+            for char in line:
+                if not isinstance(char, LTChar) or not char.get_text().strip():
+                    continue
+                x0.append(char.x0)
+                y0.append(char.y0)
+                x1.append(char.x1)
+                y1.append(char.y1)
+                element_index.append(index)
+                fontname = char.fontname.lower()
+                bold.append('bold' in fontname or 'black' in fontname or 'heavy' in fontname)
+                texts.append(char.get_text())
+    return (np.array(x0), np.array(y0), np.array(x1), np.array(y1),
+            np.array(element_index), np.array(bold, dtype=bool), texts)
+
+def _collect_rules(layout):
+    """Horizontal and vertical ruling lines as (position, start, end) arrays."""
+    horizontal, vertical = [], []
+    for element in layout:
+        if not isinstance(element, LTCurve):
+            continue
+        width, height = element.x1 - element.x0, element.y1 - element.y0
+        if height <= MAX_RULE_WIDTH < width:
+            horizontal.append(((element.y0 + element.y1) / 2, element.x0, element.x1))
+        elif width <= MAX_RULE_WIDTH < height:
+            vertical.append(((element.x0 + element.x1) / 2, element.y0, element.y1))
+    return np.array(horizontal).reshape(-1, 3), np.array(vertical).reshape(-1, 3)
+
+def _runs(mask):
+    """Start and end (exclusive) column of every run of True in each row of a 2-D mask."""
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    starts = np.argwhere(edges == 1)
+    ends = np.argwhere(edges == -1)
+    # argwhere is row-major, so starts and ends of the same run line up
+    return starts[:, 0], starts[:, 1], ends[:, 1]
+
+def _group_runs(flags):
+    """(first, last) index pairs of the runs of True in a 1-D boolean array."""
+    _, starts, ends = _runs(flags[np.newaxis, :])
+    return list(zip(starts, ends - 1))
+
+def _cell_texts(order, keys, x0, x1, line_ids, heights, texts):
+    """Join glyphs, already sorted into cells, inserting spaces at word gaps and line breaks."""
+    cells = {}
+    previous_key = previous_line = previous_x1 = None
+    for position in order:
+        key = keys[position]
+        if key != previous_key:
+            cells[key] = [texts[position]]
+        else:
+            gap = x0[position] - previous_x1
+            if line_ids[position] != previous_line or gap > 0.25 * heights[position]:
+                cells[key].append(' ')
+            cells[key].append(texts[position])
+        previous_key, previous_line, previous_x1 = key, line_ids[position], x1[position]
+    return {key: ''.join(parts) for key, parts in cells.items()}
+
+def _is_header(rows, row_bold):
+    """Treat the first row as a header when it is bold or the only non-numeric row."""
+    if len(rows) < 2:
+        return False
+    if row_bold[0] and not row_bold[1:].all():
+        return True
+    first_numeric = any(NUMERIC_CELL.match(cell) for cell in rows[0] if cell)
+    body_cells = [cell for row in rows[1:] for cell in row if cell]
+    body_numeric = sum(1 for cell in body_cells if NUMERIC_CELL.match(cell))
+    return not first_numeric and body_numeric * 2 >= len(body_cells) > 0
+
+def detect_tables(layout):
+    """Find the tables on a pdfminer LTPage and return them as a list of DetectedTable."""
+    x0, y0, x1, y1, element_index, bold, texts = _collect_glyphs(layout)
+    if len(texts) < MIN_TABLE_ROWS * MIN_TABLE_COLUMNS:
+        return []
+
+    heights = y1 - y0
+    glyph_height = float(np.median(heights))
+    centres = (y0 + y1) / 2
+
+    # Rows: split the glyph centres, top to bottom, wherever they jump by more than the tolerance
+    by_height = np.argsort(-centres, kind='stable')
+    jumps = np.diff(centres[by_height]) < -ROW_TOLERANCE * glyph_height
+    row_of = np.empty(len(texts), dtype=np.int64)
+    row_of[by_height] = np.concatenate(([0], np.cumsum(jumps)))
+    row_count = int(row_of.max()) + 1
+
+    row_top = np.full(row_count, -np.inf)
+    row_bottom = np.full(row_count, np.inf)
+    row_left = np.full(row_count, np.inf)
+    row_right = np.full(row_count, -np.inf)
+    np.maximum.at(row_top, row_of, y1)
+    np.minimum.at(row_bottom, row_of, y0)
+    np.minimum.at(row_left, row_of, x0)
+    np.maximum.at(row_right, row_of, x1)
+
+    # Occupancy of every row at one point resolution, from +1/-1 edges and a cumulative sum
+    width = int(np.ceil(max(layout.width, x1.max()))) + 2
+    starts = np.clip(np.floor(x0).astype(np.int64), 0, width - 1)
+    ends = np.clip(np.ceil(x1).astype(np.int64), 0, width - 1)
+    edges = np.zeros((row_count, width + 1), dtype=np.int32)
+    np.add.at(edges, (row_of, starts), 1)
+    np.add.at(edges, (row_of, ends), -1)
+    occupied = np.cumsum(edges, axis=1)[:, :width] > 0
+
+    # Whitespace inside each row's extent, and how many of those gaps are column wide
+    columns = np.arange(width)
+    inside = (columns >= np.floor(row_left)[:, np.newaxis]) & (columns < np.ceil(row_right)[:, np.newaxis])
+    gap_rows, gap_starts, gap_ends = _runs(inside & ~occupied)
+    wide = (gap_ends - gap_starts) >= MIN_COLUMN_GAP
+    wide_gaps = np.bincount(gap_rows[wide], minlength=row_count)
+
+    # Candidate tables: consecutive rows with column gaps and ordinary line spacing
+    tabular = wide_gaps >= MIN_TABLE_COLUMNS - 1
+    spacing = row_bottom[:-1] - row_top[1:]
+    close = np.concatenate((spacing <= MAX_ROW_SPACING * glyph_height, [False]))
+
+    glyphs = _Glyphs(x0, x1, centres, heights, element_index, bold, texts, row_of)
+    rows = _Rows(row_top, row_bottom, row_left, row_right, occupied)
+    rules = _collect_rules(layout)
+    tables = []
+    for first, last in _group_runs(tabular):
+        # Split the run where rows are too far apart
+        breaks = np.flatnonzero(~close[first:last]) + first
+        for start, stop in zip(np.concatenate(([first], breaks + 1)), np.concatenate((breaks, [last]))):
+            table = _build_table(glyphs, rows, rules, int(start), int(stop))
+            if table is not None:
+                tables.append(table)
+    return tables
+
+def _build_table(glyphs, rows, rules, first_row, last_row):
+    """Turn the text rows first_row..last_row into a DetectedTable, or None if they have no columns."""
+    if last_row - first_row + 1 < MIN_TABLE_ROWS:
+        return None
+
+    candidate = slice(first_row, last_row + 1)
+    left = float(rows.left[candidate].min())
+    right = float(rows.right[candidate].max())
+    top = float(rows.top[candidate].max())
+    bottom = float(rows.bottom[candidate].min())
+
+    # Columns: whitespace shared by every row of the candidate
+    span = slice(int(np.floor(left)), int(np.ceil(right)))
+    shared = ~rows.occupied[candidate, span].any(axis=0)
+    _, gap_starts, gap_ends = _runs(shared[np.newaxis, :])
+    wide = (gap_ends - gap_starts) >= MIN_COLUMN_GAP
+    separators = (gap_starts[wide] + gap_ends[wide]) / 2 + span.start
+    if len(separators) < MIN_TABLE_COLUMNS - 1:
+        return None
+
+    # Rules that span the table: horizontal ones delimit table rows (wrapped cell text stays in
+    # one row), vertical ones mark the table as ruled
+    horizontal_rules, vertical_rules = rules
+    tolerance = MIN_COLUMN_GAP
+    rules = horizontal_rules[(horizontal_rules[:, 1] <= left + tolerance) & (horizontal_rules[:, 2] >= right - tolerance)
+                             & (horizontal_rules[:, 0] >= bottom - 2 * tolerance)
+                             & (horizontal_rules[:, 0] <= top + 2 * tolerance)]
+    ruled = len(rules) >= 2 or bool(((vertical_rules[:, 0] >= left - tolerance)
+                                     & (vertical_rules[:, 0] <= right + tolerance)
+                                     & (vertical_rules[:, 1] <= top) & (vertical_rules[:, 2] >= bottom)).any())
+
+    if not ruled and len(separators) < MIN_UNRULED_COLUMNS - 1:
+        return None
+
+    members = np.flatnonzero((glyphs.row_of >= first_row) & (glyphs.row_of <= last_row))
+    x0, x1, centres = glyphs.x0[members], glyphs.x1[members], glyphs.centres[members]
+    if len(rules) >= 2:
+        boundaries = np.unique(rules[:, 0])[::-1]
+        # Glyphs between the same pair of rules form one table row
+        table_row = np.searchsorted(-boundaries, -centres)
+        top, bottom = max(top, float(boundaries[0])), min(bottom, float(boundaries[-1]))
+    else:
+        table_row = glyphs.row_of[members] - first_row
+    column = np.searchsorted(separators, (x0 + x1) / 2)
+
+    # Renumber table rows densely, dropping empty bands between rules
+    used_rows, table_row = np.unique(table_row, return_inverse=True)
+    column_count = len(separators) + 1
+    keys = table_row * column_count + column
+    order = np.lexsort((x0, -centres, keys))
+    cells = _cell_texts(order, keys.tolist(), x0, x1, glyphs.row_of[members].tolist(),
+                        glyphs.heights[members], [glyphs.texts[index] for index in members])
+    table_rows = [[cells.get(row * column_count + col, '') for col in range(column_count)]
+                  for row in range(len(used_rows))]
+
+    row_bold = np.zeros(len(used_rows))
+    np.add.at(row_bold, table_row, glyphs.bold[members])
+    row_bold = row_bold / np.bincount(table_row, minlength=len(used_rows)) > 0.5
+
+    # Layout elements that are mostly inside the table are replaced by it
+    element_count = glyphs.element_index.max() + 1
+    in_table = np.bincount(glyphs.element_index[members], minlength=element_count)
+    overall = np.bincount(glyphs.element_index, minlength=element_count)
+    elements = set(np.flatnonzero(in_table * 2 > overall).tolist())
+    if not elements:
+        return None
+
+    return DetectedTable((left, bottom, right, top), table_rows, _is_header(table_rows, row_bold), ruled, elements)
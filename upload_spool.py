@@ -0,0 +1,109 @@
+import hashlib
+import os
+import tempfile
+import time
+from io import BytesIO
+
+from flask import Request, current_app
+
+class SpooledUpload:
+    """
+    Buffer for one uploaded file: kept in memory up to max_size bytes, then rolled over
+    to a named file inside directory. The SHA-256 and size are computed while the
+    multipart parser writes, and persist() moves a rolled-over upload into place with a
+    rename, so large PDFs are never copied through the Python heap.
+    """
+
+    def __init__(self, max_size, directory):
+        self._file = BytesIO()
+        self._max_size = max_size
+        self._directory = directory
+        self._sha256 = hashlib.sha256()
+        self.path = None
+        self.size = 0
+
+    def write(self, data):
+        if self.path is None and self.size + len(data) > self._max_size:
+            self._rollover()
+        self._sha256.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def _rollover(self):
+        os.makedirs(self._directory, exist_ok=True)
+        spooled = tempfile.NamedTemporaryFile(dir=self._directory, prefix='upload-', suffix='.part', delete=False)
+        spooled.write(self._file.getbuffer())
+        self._file = spooled
+        self.path = spooled.name
+
+    @property
+    def sha256(self):
+        return self._sha256.hexdigest()
+
+    def persist(self, destination):
+        """Store the upload at destination; a rolled-over upload is renamed rather than copied."""
+        if self.path is not None:
+            self._file.close()
+            os.replace(self.path, destination)
+            self.path = None
+            self._file = open(destination, 'rb')
+        else:
+            with open(destination, 'wb') as pdf_file:
+                pdf_file.write(self._file.getbuffer())
+
+    def close(self):
+        self._file.close()
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getattr__(self, name):
+        # read, readline, seek, tell, ... are served by the current buffer
+        return getattr(self._file, name)
+
+class SpoolingRequest(Request):
+    """
+    Request class that spools file uploads with SpooledUpload instead of Werkzeug's default.
+    upload_seconds is the time spent reading and parsing the request body.
+    """
+
+    upload_seconds = 0.0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Every spool created for this request, including those of a body that failed to parse
+        # and so never reached request.files; all are closed with the request
+        self._spools = []
+
+    def _load_form_data(self):
+        start = time.perf_counter()
+        try:
+            super()._load_form_data()
+        except BaseException:
+            self._close_spools()
+            raise
+        self.upload_seconds = time.perf_counter() - start
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        spool = SpooledUpload(current_app.config['UPLOAD_SPOOL_THRESHOLD'], current_app.config['UPLOAD_FOLDER'])
+        self._spools.append(spool)
+        return spool
+
+    def _close_spools(self):
+        for spool in self._spools:
+            spool.close()
+        self._spools = []
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._close_spools()
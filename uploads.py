@@ -0,0 +1,142 @@
+import hashlib
+import os
+import uuid
+import zipfile
+
+from flask import current_app
+from werkzeug.utils import secure_filename
+
+from app import db
+from models import Conversion, ConversionBatch
+from jobs import enqueue_conversion
+from upload_spool import SpooledUpload
+import conversion_cache
+import metrics
+
+# Size of the pieces copied from ZIP entries into the upload folder
+COPY_CHUNK_SIZE = 1024 * 1024
+
+class UploadError(Exception):
+    """An upload was rejected, e.g. a corrupt archive or too many files in a batch."""
+
+def save_upload(stream, original_filename):
+    """
+    Store an uploaded PDF stream in UPLOAD_FOLDER under a unique name.
+    Spooled uploads are moved into place, other streams are copied in chunks.
+    Returns (pdf_path, xml_filename, pdf_sha256).
+    """
+    # Generate unique filenames for both PDF and XML
+    unique_id = str(uuid.uuid4())
+    pdf_filename = f"{unique_id}_{original_filename}"
+    xml_filename = f"{pdf_filename.rsplit('.', 1)[0]}.xml"
+
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    os.makedirs(upload_folder, exist_ok=True)
+    pdf_path = os.path.join(upload_folder, pdf_filename)
+
+    if isinstance(stream, SpooledUpload):
+        # Hashed while the request was parsed
+        stream.persist(pdf_path)
+        return pdf_path, xml_filename, stream.sha256
+
+    digest = hashlib.sha256()
+    with open(pdf_path, 'wb') as pdf_file:
+        for chunk in iter(lambda: stream.read(COPY_CHUNK_SIZE), b''):
+            digest.update(chunk)
+            pdf_file.write(chunk)
+    return pdf_path, xml_filename, digest.hexdigest()
+
+def create_conversion(pdf_path, original_filename, xml_filename, user_id, pdf_sha256=None, batch=None,
+                      stage_timings=None):
+    """
+    Add a Conversion for a saved upload to the session without committing it.
+    An identical earlier upload completes it from the cache, otherwise a job is queued.
+    stage_timings are the upload stages measured by the caller, see metrics.collect_stages.
+    """
+    with metrics.collect_stages() as stages:
+        if pdf_sha256 is None:
+            with metrics.timed('hash'):
+                pdf_sha256 = conversion_cache.hash_file(pdf_path)
+        conversion = Conversion(
+            pdf_filename=original_filename,
+            xml_filename=xml_filename,
+            file_size=os.path.getsize(pdf_path),
+            pdf_sha256=pdf_sha256,
+            user_id=user_id,
+            batch=batch
+        )
+        db.session.add(conversion)
+
+        # Reuse the XML of an identical earlier upload, otherwise queue a job
+        with metrics.timed('cache_lookup'):
+            artifact = conversion_cache.lookup(
+                conversion_cache.cache_key(pdf_sha256, conversion_cache.converter_options()))
+
+    stages = {**(stage_timings or {}), **stages}
+    metrics.observe_stages(stages)
+    conversion.stage_timings = metrics.rounded_stages(stages)
+    if artifact is not None:
+        conversion.artifact = artifact
+        conversion.status = 'completed'
+        os.remove(pdf_path)
+    else:
+        enqueue_conversion(conversion, pdf_path)
+    return conversion
+
+def _iter_pdf_streams(files):
+    """Yield (filename, stream) for every PDF in the uploaded files, expanding ZIP archives."""
+    for file_storage in files:
+        filename = secure_filename(file_storage.filename or '')
+        if filename.lower().endswith('.zip'):
+            try:
+                archive = zipfile.ZipFile(file_storage.stream)
+            except zipfile.BadZipFile:
+                raise UploadError(f"{filename} is not a valid ZIP archive")
+            with archive:
+                for entry in archive.infolist():
+                    entry_name = secure_filename(os.path.basename(entry.filename))
+                    if entry.is_dir() or not entry_name.lower().endswith('.pdf'):
+                        continue
+                    # Archived PDFs get the same size limit as directly uploaded ones
+                    if entry.file_size > current_app.config['MAX_CONTENT_LENGTH']:
+                        raise UploadError(f"{entry_name} in {filename} exceeds the maximum upload size")
+                    with archive.open(entry) as stream:
+                        yield entry_name, stream
+        elif filename.lower().endswith('.pdf'):
+            yield filename, file_storage.stream
+        else:
+            raise UploadError(f"{filename or 'Unnamed file'} is not a PDF or ZIP file")
+
+def create_batch(files, user_id):
+    """
+    Save every PDF from the uploaded files (ZIP archives are expanded) and insert the
+    batch with all of its Conversion and job rows in a single transaction.
+    Saved files are removed again if anything fails.
+    """
+    max_files = current_app.config['BATCH_MAX_FILES']
+    batch = ConversionBatch(user_id=user_id)
+    db.session.add(batch)
+
+    saved_paths = []
+    try:
+        for filename, stream in _iter_pdf_streams(files):
+            if len(saved_paths) >= max_files:
+                raise UploadError(f"A batch may contain at most {max_files} PDF files")
+            with metrics.collect_stages() as stages, metrics.timed('upload_save'):
+                pdf_path, xml_filename, pdf_sha256 = save_upload(stream, filename)
+            saved_paths.append(pdf_path)
+            create_conversion(pdf_path, filename, xml_filename, user_id, pdf_sha256=pdf_sha256, batch=batch,
+                              stage_timings=stages)
+
+        if not saved_paths:
+            raise UploadError("No PDF files found in the upload")
+        batch.file_count = len(saved_paths)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        for pdf_path in saved_paths:
+            if os.path.exists(pdf_path):
+                os.remove(pdf_path)
+        raise
+
+    return batch
@@ -0,0 +1,364 @@
+import hashlib
+import re
+import tempfile
+from functools import lru_cache
+from io import BytesIO
+
+from lxml import etree
+
+from document_model import Figure, Table, TextBlock
+
+# Namespace of the elements in the converted XML
+XML_NAMESPACE = "http://www.example.org/pdf-xml-schema"
+XSI_NAMESPACE = "http://www.w3.org/2001/XMLSchema-instance"
+SCHEMA_LOCATION = "http://www.example.org/pdf-xml-schema http://www.example.org/pdf-document.xsd"
+
+# Written ahead of the root element, lxml would otherwise use single quotes in the declaration
+PROLOG = (b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+          b'<!DOCTYPE pdf-document SYSTEM "http://www.example.org/pdf-document.dtd">\n')
+
+# Control characters that are not allowed anywhere in an XML 1.0 document
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+# Span style references in serialized pages, see style_id
+STYLE_REF = re.compile(rb'<span style-ref="(s[0-9a-f]{16})"')
+
+# Pages of a document with a style table are spooled to disk beyond this size
+BODY_SPOOL_MEMORY = 8 * 1024 * 1024
+
+# Size of the blocks the spooled pages are copied to the sink in, see DocumentWriter.finish
+BODY_COPY_SIZE = 64 * 1024
+
+def xml_safe(text):
+    """Drop characters XML cannot represent; escaping of <, & and quotes is left to lxml."""
+    return INVALID_XML_CHARS.sub('', text)
+
+def _bbox_attributes(box):
+    """Bounding box of a model element as XML attributes."""
+    return {'x0': f'{box.x0:.2f}', 'y0': f'{box.y0:.2f}', 'x1': f'{box.x1:.2f}', 'y1': f'{box.y1:.2f}'}
+
+@lru_cache(maxsize=4096)
+def _style_attributes(style):
+    """XML attributes of a span style tuple, computed once per distinct style."""
+    return {name: xml_safe(value) for name, value in style}
+
+@lru_cache(maxsize=4096)
+def style_id(style):
+    """
+    ID of a style in the <styles> table. Derived from the style itself, so pages serialized
+    by different workers or copied from an earlier conversion agree on their references.
+    A 64-bit digest, and register_style refuses the unlikely collision anyway.
+    """
+    return 's' + hashlib.blake2b(repr(style).encode('utf-8'), digest_size=8).hexdigest()
+
+def register_style(styles, reference, style):
+    """
+    Add style to an id -> style table under its style_id. Raises if the table already
+    holds a different style under that ID, which would give spans the wrong attributes.
+    """
+    registered = styles.setdefault(reference, style)
+    if registered is not style and _style_attributes(registered) != _style_attributes(style):
+        raise Exception(f"Style ID {reference} collides: {registered!r} and {style!r}")
+
+def merge_styles(styles, new_styles):
+    """Add every entry of another id -> style table to styles, see register_style."""
+    for reference, style in new_styles.items():
+        register_style(styles, reference, style)
+
+class _Formatter:
+    """Emits indentation between elements in pretty mode and nothing in compact mode."""
+
+    def __init__(self, xf, pretty, namespace=None, styles=None):
+        self.xf = xf
+        self.pretty = pretty
+        self.prefix = f'{{{namespace}}}' if namespace else ''
+        # id -> style of the referenced styles, None to write style attributes inline
+        self.styles = styles
+
+    def tag(self, name):
+        return self.prefix + name
+
+    def newline(self, depth):
+        if self.pretty:
+            self.xf.write('\n' + '  ' * depth)
+
+def _write_table(out, table_id, table, depth):
+    """Write a model Table as a <table> with an optional <thead> and a <tbody>."""
+    xf = out.xf
+    rows = table.rows[1:] if table.header else table.rows
+    table_attributes = {
+        'id': table_id,
+        'rows': str(len(rows)),
+        'columns': str(len(table.rows[0])),
+        'border': '1' if table.ruled else '0',
+        **_bbox_attributes(table),
+    }
+    out.newline(depth)
+    with xf.element(out.tag('table'), table_attributes):
+        if table.header:
+            out.newline(depth + 1)
+            with xf.element(out.tag('thead')):
+                _write_table_row(out, table.rows[0], 'th', {'role': 'columnheader', 'scope': 'col'}, depth + 2)
+                out.newline(depth + 1)
+        out.newline(depth + 1)
+        with xf.element(out.tag('tbody')):
+            for row in rows:
+                _write_table_row(out, row, 'td', {'role': 'cell'}, depth + 2)
+            out.newline(depth + 1)
+        out.newline(depth)
+
+def _write_table_row(out, cells, cell_tag, cell_attributes, depth):
+    xf = out.xf
+    out.newline(depth)
+    with xf.element(out.tag('tr'), {'role': 'row'}):
+        for cell in cells:
+            out.newline(depth + 1)
+            with xf.element(out.tag(cell_tag), cell_attributes):
+                xf.write(xml_safe(cell))
+        out.newline(depth)
+
+def _write_page(out, page, depth):
+    """Write a model Page as a <page> element at the given nesting depth."""
+    xf = out.xf
+    page_attributes = {
+        'number': str(page.number),
+        'width': f'{page.width:.2f}',
+        'height': f'{page.height:.2f}',
+    }
+    with xf.element(out.tag('page'), page_attributes):
+        block_index = 0
+        table_index = 0
+        for element in page.elements:
+            if isinstance(element, TextBlock):
+                block_index += 1
+                out.newline(depth + 1)
+                block_attributes = {'id': f'p{page.number}-b{block_index}', **_bbox_attributes(element)}
+                with xf.element(out.tag('text-block'), block_attributes):
+                    for line in element.lines:
+                        _write_line(out, line, depth + 2)
+                    out.newline(depth + 1)
+            elif isinstance(element, Table):
+                table_index += 1
+                _write_table(out, f'p{page.number}-t{table_index}', element, depth + 1)
+            elif isinstance(element, Figure):
+                out.newline(depth + 1)
+                with xf.element(out.tag('figure'), _bbox_attributes(element)):
+                    pass
+        out.newline(depth)
+
+def _write_line(out, line, depth):
+    xf = out.xf
+    out.newline(depth)
+    with xf.element(out.tag('line'), _bbox_attributes(line)):
+        for span in line.spans:
+            text = xml_safe(span.text)
+            if not text:
+                continue
+            out.newline(depth + 1)
+            if out.styles is None:
+                attributes = _style_attributes(span.style)
+            else:
+                reference = style_id(span.style)
+                register_style(out.styles, reference, span.style)
+                attributes = {'style-ref': reference}
+            with xf.element(out.tag('span'), attributes):
+                xf.write(text)
+        out.newline(depth)
+
+def serialize_page(page, pretty=True, styles=None):
+    """
+    Serialize one page to UTF-8 bytes that DocumentWriter.write_fragment can splice into a
+    document. Used by parallel workers, which cannot share the parent's writer.
+    If styles is a dict, spans reference their style by ID and styles receives id -> style.
+    """
+    buffer = BytesIO()
+    with etree.xmlfile(buffer, encoding='utf-8') as xf:
+        # Unqualified names: the page inherits the default namespace of the document root
+        _write_page(_Formatter(xf, pretty, styles=styles), page, depth=2)
+    return buffer.getvalue()
+
+def renumber_page(fragment, old_number, new_number):
+    """
+    Give a serialized page copied from another document position its new page number.
+    Text content never contains a raw '<', so the patterns can only match the tags.
+    """
+    if old_number == new_number:
+        return fragment
+    fragment = fragment.replace(b'<page number="%d"' % old_number, b'<page number="%d"' % new_number, 1)
+    fragment = fragment.replace(b'<table id="p%d-t' % old_number, b'<table id="p%d-t' % new_number)
+    return fragment.replace(b'<text-block id="p%d-b' % old_number, b'<text-block id="p%d-b' % new_number)
+
+class _CountingSink:
+    """Passes writes through to a sink and keeps track of the number of bytes written."""
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.position = 0
+
+    def write(self, data):
+        self.position += len(data)
+        return self.sink.write(data)
+
+class DocumentWriter:
+    """
+    Incremental writer for a whole pdf-document on top of lxml.etree.xmlfile.
+    Elements are written to sink (any binary file-like object) as they are produced, with
+    lxml doing all escaping. pretty=False writes compact XML without indentation.
+
+    inline_styles=False writes every distinct span style once to a <styles> table in the
+    metadata and has the spans reference it. The table is only complete after the last
+    page, so the pages are spooled and the whole document is written to sink by finish(),
+    or on exit.
+
+    write_page and write_fragment return the byte offset and length of the page, counted
+    from body_offset, which is known once the writer is closed (0 with inline styles).
+
+        with DocumentWriter(sink, metadata) as writer:
+            for page in pages:
+                writer.write_page(page)
+    """
+
+    def __init__(self, sink, metadata, pretty=True, inline_styles=True):
+        self.sink = _CountingSink(sink)
+        self.metadata = metadata
+        self.pretty = pretty
+        self.styles = None if inline_styles else {}
+        self.body_offset = 0
+        self._body = None
+        self._contexts = []
+
+    def _enter(self, context):
+        value = context.__enter__()
+        self._contexts.append(context)
+        return value
+
+    def __enter__(self):
+        if self.styles is None:
+            self._open_document()
+        else:
+            self._body = tempfile.SpooledTemporaryFile(max_size=BODY_SPOOL_MEMORY)
+            self._body_sink = _CountingSink(self._body)
+        return self
+
+    def _open_document(self):
+        self.sink.write(PROLOG)
+        self._xf = self._enter(etree.xmlfile(self.sink, encoding='utf-8'))
+        self._out = _Formatter(self._xf, self.pretty, XML_NAMESPACE)
+        root_attributes = {
+            f'{{{XSI_NAMESPACE}}}schemaLocation': SCHEMA_LOCATION,
+            'version': '1.0',
+            'lang': 'en-US',
+        }
+        self._enter(self._xf.element(self._out.tag('pdf-document'), root_attributes,
+                                     nsmap={None: XML_NAMESPACE, 'xsi': XSI_NAMESPACE}))
+        self._write_metadata()
+        self._out.newline(1)
+        self._enter(self._xf.element(self._out.tag('document-content')))
+
+    def _write_metadata(self):
+        xf, out, metadata = self._xf, self._out, self.metadata
+        out.newline(1)
+        with xf.element(out.tag('metadata')):
+            out.newline(2)
+            with xf.element(out.tag('creation-date')):
+                xf.write(metadata['creation_date'])
+            out.newline(2)
+            with xf.element(out.tag('file-info')):
+                out.newline(3)
+                with xf.element(out.tag('file-size'), {'unit': 'bytes'}):
+                    xf.write(str(metadata['file_size']))
+                out.newline(3)
+                with xf.element(out.tag('file-format')):
+                    xf.write('application/pdf')
+                out.newline(3)
+                with xf.element(out.tag('character-encoding')):
+                    xf.write('UTF-8')
+                out.newline(2)
+            out.newline(2)
+            with xf.element(out.tag('content-sample'), {'encoding': 'base64'}):
+                xf.write(metadata['content_sample'])
+            if self.styles is not None:
+                self._write_styles()
+            out.newline(1)
+
+    def _write_styles(self):
+        xf, out = self._xf, self._out
+        out.newline(2)
+        with xf.element(out.tag('styles')):
+            for reference in sorted(self.styles):
+                out.newline(3)
+                with xf.element(out.tag('style'), {'id': reference, **_style_attributes(self.styles[reference])}):
+                    pass
+            out.newline(2)
+
+    def write_page(self, page):
+        """Write a model Page directly into the document."""
+        if self.styles is not None:
+            return self.write_fragment(serialize_page(page, self.pretty, self.styles), self.styles)
+        self._out.newline(2)
+        self._xf.flush()
+        offset = self.sink.position
+        _write_page(self._out, page, depth=2)
+        self._xf.flush()
+        return offset, self.sink.position - offset
+
+    def write_fragment(self, fragment, styles=None):
+        """
+        Splice a page already serialized by serialize_page into the document. styles maps
+        the style IDs the fragment references to their styles (it may hold more).
+        """
+        if self.styles is None:
+            self._out.newline(2)
+            self._xf.flush()
+            offset = self.sink.position
+            self.sink.write(fragment)
+            return offset, len(fragment)
+        for reference in set(STYLE_REF.findall(fragment)):
+            reference = reference.decode('ascii')
+            register_style(self.styles, reference, styles[reference])
+        if self.pretty:
+            self._body_sink.write(b'\n    ')
+        offset = self._body_sink.position
+        self._body_sink.write(fragment)
+        return offset, len(fragment)
+
+    def flush(self):
+        if self.styles is None:
+            self._xf.flush()
+
+    def finish(self):
+        """
+        Generator that writes the head of a document with a <styles> table, now that every
+        style is known, and copies the spooled pages to sink in BODY_COPY_SIZE blocks. It
+        yields after each write, so a caller draining sink never holds the whole document.
+        Whatever it has not copied yet is written on exit.
+        """
+        if self._body is None:
+            return
+        if not self._contexts:
+            self._open_document()
+            self._xf.flush()
+            self.body_offset = self.sink.position
+            self._body.seek(0)
+            yield
+        for block in iter(lambda: self._body.read(BODY_COPY_SIZE), b''):
+            self.sink.write(block)
+            yield
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._body is not None:
+            try:
+                if exc_type is None:
+                    for _ in self.finish():
+                        pass
+            finally:
+                self._body.close()
+                self._body = None
+        # Close document-content, the root element and the xmlfile in order,
+        # indenting each closing tag
+        for depth, context in zip((1, 0, None), reversed(self._contexts)):
+            if exc_type is None and depth is not None:
+                self._out.newline(depth)
+            context.__exit__(exc_type, exc_value, traceback)
+        self._contexts = []
+        return False